@@ -5,6 +5,7 @@ from django.utils.encoding import iri_to_uri
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .models import Banner
 from .models import Order
 from .models import OrderItem
 from .models import Place
@@ -112,7 +113,19 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(Place)
 class PlaceAdmin(admin.ModelAdmin):
-    pass
+    list_display = [
+        'address',
+        'lon',
+        'lat',
+        'fetched_at',
+        'retry_at',
+    ]
+    search_fields = [
+        'normalized_address',
+    ]
+    readonly_fields = [
+        'normalized_address',
+    ]
 
 
 class OrderItemInline(admin.TabularInline):
@@ -124,6 +137,7 @@ class OrderItemInline(admin.TabularInline):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
+    readonly_fields = ['total_price']
 
     def response_change(self, request, obj):
         res = super(OrderAdmin, self).response_change(request, obj)
@@ -132,3 +146,44 @@ class OrderAdmin(admin.ModelAdmin):
             return redirect(url)
         else:
             return res
+
+
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'text',
+        'position',
+        'is_active',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'position',
+        'is_active',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'position',
+        'is_active',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html('<img src="{url}" height="200"/>', url=obj.image.url)
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html('<img src="{src}" height="50"/>', src=obj.image.url)
+    get_image_list_preview.short_description = 'превью'
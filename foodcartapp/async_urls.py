@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .async_views import product_list_api, banners_list_api, register_order
+
+
+app_name = "foodcartapp"
+
+urlpatterns = [
+    path('products/', product_list_api),
+    path('banners/', banners_list_api),
+    path('order/', register_order),
+]
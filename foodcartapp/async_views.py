@@ -0,0 +1,60 @@
+"""Async versions of the API views for ASGI servers.
+
+A request waiting on the database or the cache does not hold a worker thread.
+Slow clients are handled by the ASGI server, which reads the whole body before
+calling Django. The ORM and the cache are synchronous, so they are called
+through sync_to_async.
+"""
+import json
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .responses import encoded_json_response
+from .views import OrderSerializer
+from .views import get_banners, get_catalogue, get_catalogue_etag, get_catalogue_last_modified, place_order
+
+
+def get_catalogue_validators(request):
+    return get_catalogue_etag(request), get_catalogue_last_modified(request)
+
+
+async def banners_list_api(request):
+    banners = await sync_to_async(get_banners)()
+    return encoded_json_response(request, banners)
+
+
+async def product_list_api(request):
+    # django.views.decorators.http.condition wraps only sync views in Django 3.1
+    etag, modified_at = await sync_to_async(get_catalogue_validators)(request)
+    last_modified = timegm(modified_at.utctimetuple())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        catalogue = await sync_to_async(get_catalogue)()
+        response = encoded_json_response(request, catalogue)
+    if request.method in ('GET', 'HEAD'):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def register_order(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        data = json.loads(request.body)
+    except ValueError as error:
+        return JsonResponse({'detail': f'JSON parse error - {error}'}, status=400)
+
+    serializer = OrderSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400, json_dumps_params={'ensure_ascii': False})
+    data, response_status = await sync_to_async(place_order)(serializer)
+    return JsonResponse(data, status=response_status, json_dumps_params={'ensure_ascii': False})
+
+
+# csrf_exempt wraps only sync views in Django 3.1. The sync view is exempt as a DRF view
+register_order.csrf_exempt = True
@@ -0,0 +1,23 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+CATALOGUE_VERSION_KEY = 'catalogue_version'
+BANNERS_VERSION_KEY = 'banners_version'
+RESTAURANTS_INDEX_VERSION_KEY = 'restaurants_index_version'
+
+
+def get_cache_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = (uuid4().hex, timezone.now())
+        cache.add(key, version, timeout=None)
+        # Another process may have added its version first. A cache that keeps nothing returns None
+        version = cache.get(key) or version
+    return version
+
+
+def bump_cache_version(key):
+    cache.set(key, (uuid4().hex, timezone.now()), timeout=None)
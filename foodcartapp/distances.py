@@ -0,0 +1,46 @@
+import numpy as np
+from django.conf import settings
+from geopy import distance
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_points_array(points):
+    return np.array(
+        [point if point is not None else (np.nan, np.nan) for point in points],
+        dtype=float
+    ).reshape(-1, 2)
+
+
+def calculate_haversine_matrix(points1, points2):
+    lon1, lat1 = np.radians(points1[:, 0])[:, np.newaxis], np.radians(points1[:, 1])[:, np.newaxis]
+    lon2, lat2 = np.radians(points2[:, 0])[np.newaxis, :], np.radians(points2[:, 1])[np.newaxis, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def calculate_geodesic_matrix(points1, points2):
+    matrix = np.full((len(points1), len(points2)), np.nan)
+    for i, (lon1, lat1) in enumerate(points1):
+        for j, (lon2, lat2) in enumerate(points2):
+            if np.isnan([lon1, lat1, lon2, lat2]).any():
+                continue
+            matrix[i, j] = distance.distance((lat1, lon1), (lat2, lon2)).km
+    return matrix
+
+
+def calculate_distance_matrix(points1, points2, engine=None):
+    """Return an (N, M) array of distances in km between two lists of (lon, lat).
+
+    Unknown points are passed as None and give NaN distances.
+    """
+    points1, points2 = to_points_array(points1), to_points_array(points2)
+    engine = engine or settings.DISTANCE_ENGINE
+    if engine == 'geodesic':
+        matrix = calculate_geodesic_matrix(points1, points2)
+    elif engine == 'haversine':
+        matrix = calculate_haversine_matrix(points1, points2)
+    else:
+        raise ValueError(f'Unknown distance engine: {engine}')
+    return np.round(matrix, 3)
@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from .models import Order
+from .models import Place
+from .models import normalize_address
+from .models import Restaurant
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+coordinates_cache = LRUCache(settings.GEOCODER_CACHE_SIZE)
+_missing = object()
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=settings.GEOCODER_WORKERS))
+session.mount('http://', HTTPAdapter(pool_maxsize=settings.GEOCODER_WORKERS))
+
+executor = ThreadPoolExecutor(max_workers=settings.GEOCODER_WORKERS, thread_name_prefix='geocoder')
+pending_lookups = {}
+pending_lookups_lock = threading.Lock()
+
+
+def fetch_coordinates(apikey, place):
+    params = {"geocode": place, "apikey": apikey, "format": "json"}
+    response = session.get(settings.GEOCODER_URL, params=params, timeout=settings.GEOCODER_TIMEOUT)
+    response.raise_for_status()
+    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+    if not found_places:
+        return None
+    most_relevant = found_places[0]
+    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+    return float(lon), float(lat)
+
+
+def get_place_point(lon, lat, retry_at, now):
+    """Return (lon, lat), None for a known-bad address or _missing when it is time to retry."""
+    if lon is not None and lat is not None:
+        return lon, lat
+    if retry_at is not None and retry_at <= now:
+        return _missing
+    return None
+
+
+def get_coordinates(addresses, deadline=None):
+    """Return a dict mapping every address to its (lon, lat) or None.
+
+    Addresses are looked up by their normalized form in the in-process LRU
+    first, then in the Place table with a single query, and only the
+    remaining ones are geocoded. Addresses that failed recently are None
+    until their retry time. Addresses not geocoded within `deadline`
+    seconds are returned as None and keep resolving in the background.
+    """
+    now = timezone.now()
+    points = {}
+    missing = {}
+    for address in set(addresses):
+        if not address:
+            continue
+        normalized_address = normalize_address(address)
+        cached = coordinates_cache.get(normalized_address, _missing)
+        point = _missing if cached is _missing else get_place_point(*cached, now)
+        if point is _missing:
+            missing.setdefault(normalized_address, address)
+        else:
+            points[normalized_address] = point
+
+    if missing:
+        places = Place.objects.filter(normalized_address__in=missing).\
+            values_list('normalized_address', 'lon', 'lat', 'retry_at')
+        for normalized_address, lon, lat, retry_at in places:
+            point = get_place_point(lon, lat, retry_at, now)
+            if point is _missing:
+                continue
+            points[normalized_address] = point
+            coordinates_cache.set(normalized_address, (lon, lat, retry_at))
+            del missing[normalized_address]
+
+    if missing:
+        if deadline is None:
+            deadline = settings.GEOCODER_DEADLINE
+        geocoded = geocode_addresses(missing.values(), deadline)
+        for normalized_address, address in missing.items():
+            points[normalized_address] = geocoded[address]
+
+    return {
+        address: points.get(normalize_address(address)) if address else None
+        for address in addresses
+    }
+
+
+def geocode_addresses(addresses, deadline=None):
+    futures = {address: submit_lookup(address) for address in addresses}
+    done, _ = wait(futures.values(), timeout=deadline)
+    return {
+        address: future.result() if future in done else None
+        for address, future in futures.items()
+    }
+
+
+def submit_lookup(address):
+    normalized_address = normalize_address(address)
+    with pending_lookups_lock:
+        future = pending_lookups.get(normalized_address)
+        if future is None:
+            future = executor.submit(geocode_address, address)
+            pending_lookups[normalized_address] = future
+    return future
+
+
+def geocode_address(address):
+    point = None
+    try:
+        try:
+            point = fetch_coordinates(settings.YANDEX_API_KEY, address)
+        except (RequestException, KeyError, ValueError):
+            save_place(address, failed=True)
+        else:
+            save_place(address, point)
+    except Exception:
+        # An error left in the future would be raised again in every page waiting for it
+        logger.exception('Failed to save the coordinates of "%s"', address)
+    finally:
+        connection.close()
+        with pending_lookups_lock:
+            pending_lookups.pop(normalize_address(address), None)
+    return point
+
+
+def save_place(address, point=None, failed=False):
+    """Record a geocoder answer. Failures and empty answers are retried later."""
+    place, _ = Place.objects.get_or_create(
+        normalized_address=normalize_address(address),
+        defaults={'address': address},
+    )
+    place.fetched_at = timezone.now()
+    place.lon, place.lat = point or (None, None)
+    if point:
+        place.failed_attempts = 0
+        place.retry_at = None
+    elif failed:
+        place.failed_attempts += 1
+        retry_delay = min(
+            settings.GEOCODER_RETRY_DELAY * 2 ** (place.failed_attempts - 1),
+            settings.GEOCODER_MAX_RETRY_DELAY
+        )
+        place.retry_at = place.fetched_at + timedelta(seconds=retry_delay)
+    else:
+        place.failed_attempts = 0
+        place.retry_at = place.fetched_at + timedelta(seconds=settings.GEOCODER_NOT_FOUND_TTL)
+    # Before saving, because the post_save signals read the coordinates through the LRU
+    coordinates_cache.set(place.normalized_address, (place.lon, place.lat, place.retry_at))
+    place.save()
+    return place
+
+
+def iterate_address_pages(queryset, page_size):
+    last_address = None
+    while True:
+        page = queryset
+        if last_address is not None:
+            page = page.filter(address__gt=last_address)
+        page = list(page.order_by('address').values_list('address', flat=True).distinct()[:page_size])
+        if not page:
+            return
+        yield page
+        last_address = page[-1]
+
+
+def find_addresses_to_geocode(limit):
+    known_places = Place.objects.filter(Q(retry_at__isnull=True) | Q(retry_at__gt=timezone.now()))
+    known_addresses = known_places.values('address')
+    candidates = [
+        Restaurant.objects.exclude(address='').exclude(address__in=known_addresses),
+        Order.objects.exclude(address__in=known_addresses),
+    ]
+
+    addresses = {}
+    for queryset in candidates:
+        for page in iterate_address_pages(queryset, limit):
+            # Spelling variants of known addresses do not match by exact string, so a page may hold no misses
+            page_addresses = {normalize_address(address): address for address in page}
+            known_normalized_addresses = set(
+                known_places.filter(normalized_address__in=page_addresses).values_list('normalized_address', flat=True)
+            )
+            for normalized_address, address in page_addresses.items():
+                if normalized_address not in known_normalized_addresses:
+                    addresses.setdefault(normalized_address, address)
+            if len(addresses) >= limit:
+                return list(addresses.values())[:limit]
+    return list(addresses.values())
+
+
+def fetch_coordinates_with_retries(address, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return fetch_coordinates(settings.YANDEX_API_KEY, address)
+        except RequestException:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
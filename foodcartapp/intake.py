@@ -0,0 +1,80 @@
+import json
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order
+from .models import OrderEvent
+from .models import OrderIntake
+from .models import OrderItem
+from .models import Product
+
+
+def enqueue_order(validated_data):
+    payload = {
+        'firstname': validated_data['firstname'],
+        'lastname': validated_data['lastname'],
+        'phonenumber': str(validated_data['phonenumber']),
+        'address': validated_data['address'],
+        'products': [
+            {
+                'product': fields['product'].id,
+                'quantity': fields['quantity'],
+                'price': str(fields['product'].price * fields['quantity']),
+            } for fields in validated_data['order_items']
+        ],
+    }
+    return OrderIntake.objects.create(payload=json.dumps(payload, ensure_ascii=False))
+
+
+def process_intake_batch(batch_size):
+    """Turn up to batch_size queued intakes into orders. Returns the number processed."""
+    with transaction.atomic():
+        intakes = list(
+            OrderIntake.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not intakes:
+            return 0
+
+        payloads = [json.loads(intake.payload) for intake in intakes]
+        orders = [
+            Order(
+                firstname=payload['firstname'],
+                lastname=payload['lastname'],
+                phonenumber=payload['phonenumber'],
+                address=payload['address'],
+                registered_at=intake.received_at,
+                total_price=sum(Decimal(fields['price']) for fields in payload['products']),
+            ) for intake, payload in zip(intakes, payloads)
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            # bulk_create sends no post_save, so the dashboard events are published here
+            Order.objects.bulk_create(orders)
+            OrderEvent.objects.bulk_create([OrderEvent(order_id=order.id) for order in orders])
+        else:
+            for order in orders:
+                order.save()
+
+        product_ids = Product.objects.filter(
+            id__in={fields['product'] for payload in payloads for fields in payload['products']}
+        ).values_list('id', flat=True)
+        existing_product_ids = set(product_ids)
+        order_items = [
+            OrderItem(
+                order=order,
+                product_id=fields['product'] if fields['product'] in existing_product_ids else None,
+                quantity=fields['quantity'],
+                price=fields['price'],
+            ) for order, payload in zip(orders, payloads) for fields in payload['products']
+        ]
+        OrderItem.objects.bulk_create(order_items)
+
+        processed_at = timezone.now()
+        for intake, order in zip(intakes, orders):
+            intake.order = order
+            intake.processed_at = processed_at
+        OrderIntake.objects.bulk_update(intakes, ['order', 'processed_at'])
+    return len(intakes)
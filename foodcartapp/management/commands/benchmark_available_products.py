@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the DISTINCT join with the EXISTS subquery of Product.objects.available(). Nothing is saved.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=500)
+        parser.add_argument('--products', type=int, default=300)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        try:
+            with transaction.atomic():
+                self.fill_menu(options['restaurants'], options['products'])
+                querysets = {
+                    'distinct join': lambda: Product.objects.select_related('category').distinct().
+                    filter(menu_items__availability=True),
+                    'exists subquery': lambda: Product.objects.select_related('category').available(),
+                }
+                for title, get_queryset in querysets.items():
+                    started_at = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        products = list(get_queryset())
+                    query_time = (time.perf_counter() - started_at) / options['repeat'] * 1000
+                    self.stdout.write(f'{title}: {query_time:.1f} ms, {len(products)} products')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def fill_menu(self, restaurants_count, products_count):
+        category = ProductCategory.objects.create(name='Бургеры')
+        Product.objects.bulk_create([
+            Product(name=f'Бургер №{number}', category=category, price=199, image='burger.jpg')
+            for number in range(products_count)
+        ])
+        Restaurant.objects.bulk_create([
+            Restaurant(name=f'Star Burger №{number}', address=f'Москва, Тверская, {number}')
+            for number in range(restaurants_count)
+        ])
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        restaurant_ids = list(Restaurant.objects.values_list('id', flat=True))
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant_id=restaurant_id, product_id=product_id,
+                               availability=random.random() < 0.9)
+            for restaurant_id in restaurant_ids for product_id in product_ids
+        ])
+        self.stdout.write(f'{restaurants_count} restaurants x {products_count} products')
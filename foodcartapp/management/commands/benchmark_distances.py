@@ -0,0 +1,42 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from geopy import distance
+
+from foodcartapp.distances import calculate_distance_matrix
+
+
+def get_random_points(count):
+    return [(random.uniform(37.3, 37.9), random.uniform(55.5, 55.95)) for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Compare per-pair geopy distances with the vectorized distance matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--restaurants', type=int, default=200)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        order_points = get_random_points(options['orders'])
+        restaurant_points = get_random_points(options['restaurants'])
+        self.stdout.write(f'{len(order_points)} orders x {len(restaurant_points)} restaurants')
+
+        started_at = time.perf_counter()
+        per_pair = [
+            [distance.distance((lat1, lon1), (lat2, lon2)).km for lon2, lat2 in restaurant_points]
+            for lon1, lat1 in order_points
+        ]
+        self.report('geopy per pair', started_at)
+
+        for engine in ['haversine', 'geodesic']:
+            started_at = time.perf_counter()
+            matrix = calculate_distance_matrix(order_points, restaurant_points, engine=engine)
+            self.report(f'matrix, {engine}', started_at)
+            max_error = abs(matrix - per_pair).max()
+            self.stdout.write(f'  max difference from geopy: {max_error:.3f} km')
+
+    def report(self, title, started_at):
+        self.stdout.write(f'{title}: {time.perf_counter() - started_at:.3f} s')
@@ -0,0 +1,80 @@
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Load a running server with concurrent GET requests and report requests/s and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='for example http://127.0.0.1:8000/api/products/')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='connections that send an order one byte per second while the load runs')
+
+    def send_slowly(self, url, stop_event):
+        body = b'{"products": []}' + b' ' * 1000
+        with socket.create_connection((url.hostname, url.port or 80)) as connection:
+            connection.sendall(
+                f'POST /api/order/ HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n'.encode()
+            )
+            for byte in body:
+                if stop_event.wait(1):
+                    return
+                try:
+                    connection.sendall(bytes([byte]))
+                except OSError:
+                    # The server gave up waiting for the body
+                    return
+
+    def handle(self, *args, **options):
+        local = threading.local()
+
+        def send_request(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started_at = time.perf_counter()
+            try:
+                response = local.session.get(options['url'], timeout=30)
+                is_ok = response.ok
+            except requests.RequestException:
+                is_ok = False
+            return time.perf_counter() - started_at, is_ok
+
+        stop_event = threading.Event()
+        slow_clients = [
+            threading.Thread(target=self.send_slowly, args=(urlsplit(options['url']), stop_event))
+            for _ in range(options['slow_clients'])
+        ]
+        for slow_client in slow_clients:
+            slow_client.start()
+        # Let the slow clients take their connections first
+        time.sleep(1 if slow_clients else 0)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            started_at = time.perf_counter()
+            results = list(executor.map(send_request, range(options['requests'])))
+            total_time = time.perf_counter() - started_at
+
+        stop_event.set()
+        for slow_client in slow_clients:
+            slow_client.join()
+
+        timings = sorted(timing for timing, is_ok in results)
+        errors = sum(1 for timing, is_ok in results if not is_ok)
+        self.stdout.write(
+            f'{len(results)} requests, concurrency {options["concurrency"]}: '
+            f'{options["slow_clients"]} slow clients: {len(results) / total_time:.0f} requests/s, {errors} errors'
+        )
+        self.stdout.write(
+            f'latency: median {statistics.median(timings) * 1000:.1f} ms, '
+            f'p99 {timings[int(len(timings) * 0.99)] * 1000:.1f} ms'
+        )
@@ -0,0 +1,65 @@
+import gzip
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from foodcartapp.responses import brotli, encode_json, orjson
+
+
+def get_catalogue(products_count):
+    return [
+        {
+            'id': product_id,
+            'name': f'Бургер №{product_id}',
+            'price': Decimal('349.00'),
+            'special_status': product_id % 5 == 0,
+            'description': 'Сочная котлета из говядины, сыр чеддер, маринованные огурцы и фирменный соус',
+            'category': {
+                'id': product_id % 4,
+                'name': 'Бургеры',
+            },
+            'image': f'/media/burger_{product_id}.jpg',
+            'restaurants': [
+                {
+                    'id': restaurant_id,
+                    'name': f'Star Burger №{restaurant_id}',
+                } for restaurant_id in range(5)
+            ]
+        } for product_id in range(products_count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and encode time of the API JSON encoders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        catalogue = get_catalogue(options['products'])
+        encoders = {
+            'stdlib, indent=4': lambda data: json.dumps(
+                data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=4
+            ).encode(),
+            'stdlib, compact': lambda data: json.dumps(
+                data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')
+            ).encode(),
+        }
+        if orjson is not None:
+            encoders['orjson'] = encode_json
+
+        self.stdout.write(f'{options["products"]} products, {options["repeat"]} runs')
+        for title, encoder in encoders.items():
+            started_at = time.perf_counter()
+            for _ in range(options['repeat']):
+                content = encoder(catalogue)
+            encode_time = (time.perf_counter() - started_at) / options['repeat'] * 1000
+
+            sizes = [f'{len(content)} B', f'gzip {len(gzip.compress(content))} B']
+            if brotli is not None:
+                sizes.append(f'br {len(brotli.compress(content))} B')
+            self.stdout.write(f'{title}: {encode_time:.3f} ms, {", ".join(sizes)}')
@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from foodcartapp.models import Product, ProductCategory
+from foodcartapp.views import register_order
+
+
+STREETS = ['Тверская', 'Арбат', 'Мясницкая', 'Пятницкая', 'Ленинский проспект', 'Профсоюзная']
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_products():
+    products = list(Product.objects.all())
+    if products:
+        return products
+    category = ProductCategory.objects.create(name='Бургеры')
+    return [
+        Product.objects.create(name=f'Бургер №{number}', category=category, price=199 + number, image='burger.jpg')
+        for number in range(20)
+    ]
+
+
+def get_order_payload(products):
+    return {
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': f'+7926{random.randint(1000000, 9999999)}',
+        'address': f'Москва, {random.choice(STREETS)}, {random.randint(1, 120)}',
+        'products': [
+            {'product': product.id, 'quantity': random.randint(1, 3)}
+            for product in random.sample(products, random.randint(1, min(5, len(products))))
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Post orders to register_order in-process and report throughput. Nothing is saved.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        factory = APIRequestFactory()
+        query_counter = QueryCounter()
+        try:
+            with transaction.atomic():
+                products = get_products()
+                payloads = [get_order_payload(products) for _ in range(options['orders'])]
+
+                timings = []
+                with connection.execute_wrapper(query_counter):
+                    started_at = time.perf_counter()
+                    for payload in payloads:
+                        request = factory.post('/api/order/', payload, format='json')
+                        request_started_at = time.perf_counter()
+                        response = register_order(request)
+                        timings.append(time.perf_counter() - request_started_at)
+                        assert response.status_code == 200, response.data
+                    total_time = time.perf_counter() - started_at
+                raise Rollback
+        except Rollback:
+            pass
+
+        timings.sort()
+        self.stdout.write(f'{len(timings)} orders in {total_time:.2f} s, {len(timings) / total_time:.0f} orders/s')
+        self.stdout.write(
+            f'latency: median {statistics.median(timings) * 1000:.2f} ms, '
+            f'p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms'
+        )
+        self.stdout.write(f'queries per order: {query_counter.count / len(timings):.1f}')
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from requests.exceptions import RequestException
+
+from foodcartapp.geocoder import fetch_coordinates_with_retries, find_addresses_to_geocode, save_place
+
+
+class Command(BaseCommand):
+    help = 'Geocode order and restaurant addresses without known coordinates and refresh their distances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--rate', type=float, default=5, help='max geocoder requests per second')
+        parser.add_argument('--retries', type=int, default=3)
+        parser.add_argument('--backoff', type=float, default=1, help='first retry delay in seconds')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='seconds to sleep when there is nothing to geocode')
+        parser.add_argument('--once', action='store_true', help='geocode one batch and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            addresses = find_addresses_to_geocode(options['batch_size'])
+            if addresses:
+                self.geocode_batch(addresses, options)
+            if options['once']:
+                return
+            if not addresses:
+                time.sleep(options['interval'])
+
+    def geocode_batch(self, addresses, options):
+        geocoded_addresses = []
+        for address in addresses:
+            started_at = time.monotonic()
+            try:
+                point = fetch_coordinates_with_retries(address, options['retries'], options['backoff'])
+            except (RequestException, KeyError, ValueError) as error:
+                self.stderr.write(f'Failed to geocode "{address}": {error!r}')
+                save_place(address, failed=True)
+            else:
+                save_place(address, point)
+                if point:
+                    geocoded_addresses.append(address)
+            time.sleep(max(0, 1 / options['rate'] - (time.monotonic() - started_at)))
+
+        # save_place stores the distances of the geocoded addresses, see update_distances_for_place
+        self.stdout.write(f'Geocoded {len(geocoded_addresses)} of {len(addresses)} addresses')
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.intake import process_intake_batch
+
+
+class Command(BaseCommand):
+    help = 'Create orders from the intake queue filled by /api/order/ in queue mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_INTAKE_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1,
+                            help='seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='drain the queue and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_intake_batch(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} orders')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
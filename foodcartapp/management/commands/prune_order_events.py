@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import OrderEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete order change events the live orders page no longer needs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.ORDER_EVENTS_TTL,
+                            help='age of the events to delete, in seconds')
+
+    def handle(self, *args, **options):
+        created_before = timezone.now() - timedelta(seconds=options['older_than'])
+        deleted, _ = OrderEvent.objects.filter(created_at__lt=created_before).delete()
+        self.stdout.write(f'Deleted {deleted} events')
@@ -0,0 +1,114 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from foodcartapp.models import normalize_address
+from foodcartapp.models import Order
+from foodcartapp.models import OrderItem
+from foodcartapp.models import Place
+from foodcartapp.models import Product
+from foodcartapp.models import ProductCategory
+from foodcartapp.models import Restaurant
+from foodcartapp.models import RestaurantMenuItem
+from foodcartapp.cache import CATALOGUE_VERSION_KEY, RESTAURANTS_INDEX_VERSION_KEY, bump_cache_version
+from foodcartapp.spatial import update_order_distances
+
+
+STREETS = ['Тверская', 'Арбат', 'Мясницкая', 'Пятницкая', 'Ленинский проспект', 'Профсоюзная']
+CATEGORIES = ['Бургеры', 'Напитки', 'Десерты', 'Закуски']
+
+
+def get_random_point():
+    return 37.35 + random.random() * 0.5, 55.6 + random.random() * 0.3
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with restaurants, products, menu items and orders for benchmarks and tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--addresses', type=int, default=500, help='distinct delivery addresses')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            products = self.create_menu(options['restaurants'], options['products'])
+            # bulk_create sends no signals, so the caches are invalidated here
+            bump_cache_version(CATALOGUE_VERSION_KEY)
+            bump_cache_version(RESTAURANTS_INDEX_VERSION_KEY)
+            orders = self.create_orders(options['orders'], options['addresses'], products)
+            update_order_distances(orders)
+        self.stdout.write(
+            f'{options["restaurants"]} restaurants, {options["products"]} products, {options["orders"]} orders'
+        )
+
+    def create_menu(self, restaurants_count, products_count):
+        categories = [ProductCategory.objects.create(name=name) for name in CATEGORIES]
+        first_product_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        Product.objects.bulk_create([
+            Product(name=f'Товар №{number}', category=random.choice(categories),
+                    price=Decimal(random.randint(50, 500)), image='burger.jpg')
+            for number in range(products_count)
+        ])
+        products = list(Product.objects.filter(id__gt=first_product_id).values_list('id', 'price'))
+
+        first_restaurant_id = Restaurant.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        restaurants = [
+            Restaurant(name=f'Star Burger №{number}', address=f'Москва, {random.choice(STREETS)}, {number + 1}')
+            for number in range(restaurants_count)
+        ]
+        Restaurant.objects.bulk_create(restaurants)
+        self.create_places(restaurant.address for restaurant in restaurants)
+
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant_id=restaurant_id, product_id=product_id,
+                               availability=random.random() < 0.9)
+            for restaurant_id in Restaurant.objects.filter(id__gt=first_restaurant_id).values_list('id', flat=True)
+            for product_id, _ in random.sample(products, k=len(products) // 2)
+        ])
+        return products
+
+    def create_orders(self, orders_count, addresses_count, products):
+        addresses = [
+            f'Москва, {random.choice(STREETS)}, {number + 1}, кв. {random.randint(1, 200)}'
+            for number in range(addresses_count)
+        ]
+        self.create_places(addresses)
+
+        orders_products = [
+            [(product, random.randint(1, 3)) for product in random.sample(products, k=random.randint(1, 4))]
+            for _ in range(orders_count)
+        ]
+        first_order_id = Order.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        Order.objects.bulk_create([
+            Order(
+                firstname='Иван',
+                lastname=f'Иванов {number}',
+                phonenumber='+79261234567',
+                address=random.choice(addresses),
+                status=int(random.random() < 0.8),
+                total_price=sum(price * quantity for (_, price), quantity in order_products),
+            ) for number, order_products in enumerate(orders_products)
+        ])
+        # SQLite does not return the ids from bulk_create
+        orders = list(Order.objects.filter(id__gt=first_order_id).order_by('id').only('id', 'address'))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=price * quantity)
+            for order, order_products in zip(orders, orders_products)
+            for (product_id, price), quantity in order_products
+        ])
+        return orders
+
+    def create_places(self, addresses):
+        # Every address gets coordinates, so the pages never call the geocoder
+        places = []
+        for address in dict.fromkeys(addresses):
+            lon, lat = get_random_point()
+            places.append(Place(address=address, normalized_address=normalize_address(address), lon=lon, lat=lat))
+        Place.objects.bulk_create(places, ignore_conflicts=True)
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0047_auto_20210228_2019'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRestaurantDistance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(verbose_name='расстояние, км')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='restaurant_distances', to='foodcartapp.Order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_distances', to='foodcartapp.Restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'расстояние до ресторана',
+                'verbose_name_plural': 'расстояния до ресторанов',
+                'unique_together': {('order', 'restaurant')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0048_orderrestaurantdistance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Banner',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50, verbose_name='заголовок')),
+                ('image', models.ImageField(upload_to='', verbose_name='картинка')),
+                ('text', models.CharField(blank=True, max_length=200, verbose_name='текст')),
+                ('position', models.PositiveIntegerField(db_index=True, default=0, verbose_name='порядок')),
+                ('is_active', models.BooleanField(db_index=True, default=True, verbose_name='показывать')),
+            ],
+            options={
+                'verbose_name': 'баннер',
+                'verbose_name_plural': 'баннеры',
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
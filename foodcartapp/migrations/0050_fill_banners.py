@@ -0,0 +1,51 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:03
+
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+
+BANNERS = [
+    {
+        'title': 'Burger',
+        'image': 'burger.jpg',
+        'text': 'Tasty Burger at your door step',
+    },
+    {
+        'title': 'Spices',
+        'image': 'food.jpg',
+        'text': 'All Cuisines',
+    },
+    {
+        'title': 'New York',
+        'image': 'tasty.jpg',
+        'text': 'Food is incomplete without a tasty dessert',
+    },
+]
+
+
+def fill_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    for position, banner_fields in enumerate(BANNERS):
+        banner = Banner(title=banner_fields['title'], text=banner_fields['text'], position=position)
+        banner.image.name = banner_fields['image']
+        # Copy the picture once, a second run must not leave renamed duplicates in MEDIA_ROOT
+        if not default_storage.exists(banner.image.name):
+            image_path = os.path.join(settings.BASE_DIR, 'assets', banner_fields['image'])
+            with open(image_path, 'rb') as image:
+                default_storage.save(banner.image.name, File(image))
+        banner.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_banner'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_banners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_fill_banners'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIntake',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField(verbose_name='данные заказа')),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='получен')),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='обработан')),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intake', to='foodcartapp.Order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'входящий заказ',
+                'verbose_name_plural': 'входящие заказы',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_orderintake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='failed_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='неудачных запросов подряд'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='запрошен у геокодера'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='повторить запрос после'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_auto_20261018_0507'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='normalized_address',
+            field=models.CharField(max_length=200, null=True, unique=True, verbose_name='нормализованный адрес'),
+        ),
+    ]
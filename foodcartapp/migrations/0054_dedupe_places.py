@@ -0,0 +1,34 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:08
+
+from django.db import migrations
+
+
+def normalize_address(address):
+    return ' '.join(address.split()).casefold()
+
+
+def dedupe_places(apps, schema_editor):
+    Place = apps.get_model('foodcartapp', 'Place')
+    places_by_address = {}
+    for place in Place.objects.order_by('id').iterator():
+        places_by_address.setdefault(normalize_address(place.address), []).append(place)
+
+    for normalized_address, places in places_by_address.items():
+        # Prefer a place with coordinates, then the most recent one
+        places.sort(key=lambda place: (place.lon is not None and place.lat is not None, place.id), reverse=True)
+        kept_place, *duplicates = places
+        if duplicates:
+            Place.objects.filter(id__in=[place.id for place in duplicates]).delete()
+        kept_place.normalized_address = normalized_address
+        kept_place.save(update_fields=['normalized_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0053_place_normalized_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_dedupe_places'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='normalized_address',
+            field=models.CharField(max_length=200, unique=True, verbose_name='нормализованный адрес'),
+        ),
+    ]
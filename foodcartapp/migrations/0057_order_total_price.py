@@ -0,0 +1,32 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:10
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    order_items_price = OrderItem.objects.filter(order=OuterRef('pk')).\
+        values('order').annotate(total_price=Sum('price')).values('total_price')
+    Order.objects.update(
+        total_price=Coalesce(Subquery(order_items_price, output_field=DecimalField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_auto_20261018_0520'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='сумма заказа'),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
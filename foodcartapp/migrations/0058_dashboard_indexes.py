@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-18 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_order_total_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'registered_at'], name='order_status_registered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(condition=models.Q(availability=True), fields=['product', 'restaurant'], name='menu_item_availability_idx'),
+        ),
+    ]
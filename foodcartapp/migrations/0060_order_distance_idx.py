@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_orderevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderrestaurantdistance',
+            index=models.Index(fields=['order', 'distance'], name='order_distance_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
-from django.db.models import Sum
+from django.db.models import DecimalField, Exists, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
@@ -20,7 +21,8 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        return self.distinct().filter(menu_items__availability=True)
+        available_menu_items = RestaurantMenuItem.objects.filter(product=OuterRef('pk'), availability=True)
+        return self.filter(Exists(available_menu_items))
 
 
 class ProductCategory(models.Model):
@@ -69,14 +71,21 @@ class RestaurantMenuItem(models.Model):
         unique_together = [
             ['restaurant', 'product']
         ]
+        indexes = [
+            # Partial, because Django 3.1 filters booleans by a bare column, and SQLite does not match that
+            # against a composite index that starts with availability
+            models.Index(fields=['product', 'restaurant'], name='menu_item_availability_idx',
+                         condition=Q(availability=True)),
+        ]
 
 
 class OrderQuerySet(models.QuerySet):
-    def fetch_with_order_price(self):
-        orders_with_price = self.annotate(
-            order_price=Sum('order_items__price')
+    def update_total_price(self):
+        order_items_price = OrderItem.objects.filter(order=OuterRef('pk')).\
+            values('order').annotate(total_price=Sum('price')).values('total_price')
+        return self.update(
+            total_price=Coalesce(Subquery(order_items_price, output_field=DecimalField()), 0)
         )
-        return orders_with_price
 
 
 class Order(models.Model):
@@ -94,6 +103,8 @@ class Order(models.Model):
     registered_at = models.DateTimeField('получен', default=timezone.now)
     called_at = models.DateTimeField('согласован', null=True, blank=True)
     delivered_at = models.DateTimeField('доставлен', null=True, blank=True)
+    total_price = models.DecimalField('сумма заказа', max_digits=10, decimal_places=2, default=0,
+                                      validators=[MinValueValidator(0)])
 
     objects = OrderQuerySet.as_manager()
 
@@ -103,6 +114,10 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+            models.Index(fields=['status', 'registered_at'], name='order_status_registered_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -119,14 +134,98 @@ class OrderItem(models.Model):
         verbose_name_plural = 'элементы заказа'
 
 
+class OrderIntake(models.Model):
+    payload = models.TextField('данные заказа')
+    received_at = models.DateTimeField('получен', default=timezone.now)
+    processed_at = models.DateTimeField('обработан', null=True, blank=True, db_index=True)
+    order = models.OneToOneField('Order', verbose_name='заказ', related_name='intake', null=True, blank=True,
+                                 on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f'{self.id} {self.received_at}'
+
+    class Meta:
+        verbose_name = 'входящий заказ'
+        verbose_name_plural = 'входящие заказы'
+
+
+class OrderEvent(models.Model):
+    # Not a foreign key: the event about a deleted order must outlive it
+    order_id = models.PositiveIntegerField('номер заказа')
+    created_at = models.DateTimeField('создано', default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.id} {self.order_id}'
+
+    class Meta:
+        verbose_name = 'изменение заказа'
+        verbose_name_plural = 'изменения заказов'
+
+
+def normalize_address(address):
+    return ' '.join(address.split()).casefold()
+
+
 class Place(models.Model):
     address = models.CharField('адрес', max_length=200)
+    normalized_address = models.CharField('нормализованный адрес', max_length=200, unique=True)
     lon = models.FloatField('долгота', null=True, blank=True)
     lat = models.FloatField('широта', null=True, blank=True)
+    fetched_at = models.DateTimeField('запрошен у геокодера', null=True, blank=True)
+    failed_attempts = models.PositiveSmallIntegerField('неудачных запросов подряд', default=0)
+    retry_at = models.DateTimeField('повторить запрос после', null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f'{self.address} ({self.lon}, {self.lat})'
 
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'место'
         verbose_name_plural = 'места'
+
+
+class OrderRestaurantDistance(models.Model):
+    order = models.ForeignKey('Order', verbose_name='заказ', related_name='restaurant_distances',
+                              on_delete=models.CASCADE)
+    restaurant = models.ForeignKey('Restaurant', verbose_name='ресторан', related_name='order_distances',
+                                   on_delete=models.CASCADE)
+    distance = models.FloatField('расстояние, км')
+
+    def __str__(self):
+        return f'{self.order} - {self.restaurant}: {self.distance} км'
+
+    class Meta:
+        verbose_name = 'расстояние до ресторана'
+        verbose_name_plural = 'расстояния до ресторанов'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'distance'], name='order_distance_idx'),
+        ]
+
+
+class BannerQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+
+class Banner(models.Model):
+    title = models.CharField('заголовок', max_length=50)
+    image = models.ImageField('картинка')
+    text = models.CharField('текст', max_length=200, blank=True)
+    position = models.PositiveIntegerField('порядок', default=0, db_index=True)
+    is_active = models.BooleanField('показывать', default=True, db_index=True)
+
+    objects = BannerQuerySet.as_manager()
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
@@ -0,0 +1,79 @@
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MIN_COMPRESSED_LENGTH = 200
+
+django_json_encoder = DjangoJSONEncoder()
+
+
+def parse_accept_encoding(accept_encoding):
+    """Return a dict mapping every content coding in the header to its q-value."""
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    return qualities
+
+
+def accepts_coding(qualities, coding):
+    return qualities.get(coding, qualities.get('*', 0)) > 0
+
+
+def encode_json(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=django_json_encoder.default)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class EncodedJson:
+    """JSON payload encoded and compressed once, ready to be sent many times."""
+
+    def __init__(self, data):
+        self.content = encode_json(data)
+        self.gzip_content = None
+        self.brotli_content = None
+        if len(self.content) >= MIN_COMPRESSED_LENGTH:
+            self.gzip_content = gzip.compress(self.content)
+            if brotli is not None:
+                self.brotli_content = brotli.compress(self.content)
+
+    def get_content(self, accept_encoding):
+        qualities = parse_accept_encoding(accept_encoding)
+        if self.brotli_content is not None and accepts_coding(qualities, 'br'):
+            return self.brotli_content, 'br'
+        if self.gzip_content is not None and accepts_coding(qualities, 'gzip'):
+            return self.gzip_content, 'gzip'
+        return self.content, None
+
+
+def encoded_json_response(request, encoded_json):
+    content, encoding = encoded_json.get_content(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = HttpResponse(content, content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import BANNERS_VERSION_KEY, CATALOGUE_VERSION_KEY, RESTAURANTS_INDEX_VERSION_KEY, bump_cache_version
+from .models import Banner
+from .models import Order
+from .models import OrderEvent
+from .models import OrderItem
+from .models import Place
+from .models import Product
+from .models import ProductCategory
+from .models import Restaurant
+from .models import RestaurantMenuItem
+from .spatial import refresh_restaurant_distances, update_order_distances
+
+
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=Restaurant)
+def remember_address(sender, instance, **kwargs):
+    instance._saved_address = instance.__dict__.get('address')
+
+
+def address_changed(instance, created):
+    return created or instance._saved_address != instance.address
+
+
+@receiver(post_save, sender=Order)
+def update_distances_for_order(sender, instance, created, **kwargs):
+    if not address_changed(instance, created):
+        return
+    instance._saved_address = instance.address
+    # Never wait for the geocoder here. Once the address is geocoded, update_distances_for_place stores them
+    transaction.on_commit(lambda: update_order_distances([instance], deadline=0))
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_restaurants_index(sender, instance, created, **kwargs):
+    if not address_changed(instance, created):
+        return
+    instance._saved_address = instance.address
+    bump_cache_version(RESTAURANTS_INDEX_VERSION_KEY)
+    transaction.on_commit(lambda: refresh_restaurant_distances([instance.id]))
+
+
+@receiver(post_save, sender=Place)
+def update_distances_for_place(sender, instance, **kwargs):
+    if instance.lon is None or instance.lat is None:
+        return
+
+    def update_distances():
+        restaurant_ids = list(Restaurant.objects.filter(address=instance.address).values_list('id', flat=True))
+        if restaurant_ids:
+            bump_cache_version(RESTAURANTS_INDEX_VERSION_KEY)
+            refresh_restaurant_distances(restaurant_ids)
+        update_order_distances(Order.objects.filter(address=instance.address).only('id', 'address'), deadline=0)
+    transaction.on_commit(update_distances)
+
+
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurants_index_on_delete(sender, **kwargs):
+    bump_cache_version(RESTAURANTS_INDEX_VERSION_KEY)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_catalogue(sender, **kwargs):
+    bump_cache_version(CATALOGUE_VERSION_KEY)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    bump_cache_version(BANNERS_VERSION_KEY)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_total_price(sender, instance, **kwargs):
+    Order.objects.filter(id=instance.order_id).update_total_price()
+    OrderEvent.objects.create(order_id=instance.order_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def publish_order_event(sender, instance, **kwargs):
+    OrderEvent.objects.create(order_id=instance.id)
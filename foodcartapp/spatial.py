@@ -0,0 +1,168 @@
+import heapq
+
+import numpy as np
+from django.db import transaction
+
+from .cache import RESTAURANTS_INDEX_VERSION_KEY, get_cache_version
+from .distances import calculate_distance_matrix
+from .geocoder import get_coordinates
+from .models import Order
+from .models import OrderRestaurantDistance
+from .models import Restaurant
+
+
+restaurants_index_snapshot = (None, None)
+
+
+def to_unit_vectors(points):
+    lon, lat = np.radians(points[:, 0]), np.radians(points[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class RestaurantsSpatialIndex:
+    """KD-tree over restaurant positions projected on the unit sphere.
+
+    The straight-line (chord) distance between unit vectors grows with the
+    great-circle distance, so nearest neighbours in 3D are nearest on Earth.
+    """
+
+    def __init__(self, restaurants_points, unresolved_addresses=()):
+        self.restaurant_ids = [restaurant_id for restaurant_id, point in restaurants_points]
+        self.points = np.array([point for restaurant_id, point in restaurants_points], dtype=float).reshape(-1, 2)
+        self.vectors = to_unit_vectors(self.points)
+        self.unresolved_addresses = dict(unresolved_addresses)
+        self.resolved_restaurant_ids = set(self.restaurant_ids)
+        self.root = self.build(list(range(len(self.restaurant_ids))), depth=0)
+
+    def build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda index: self.vectors[index, axis])
+        median = len(indices) // 2
+        return (
+            indices[median],
+            axis,
+            self.build(indices[:median], depth + 1),
+            self.build(indices[median + 1:], depth + 1),
+        )
+
+    def nearest(self, point, count, predicate=None):
+        """Return up to `count` (restaurant id, distance in km) nearest to (lon, lat).
+
+        Restaurants rejected by `predicate(restaurant_id)` are skipped.
+        """
+        target = to_unit_vectors(np.array([point], dtype=float))[0]
+        found = []
+
+        def search(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            difference = target[axis] - self.vectors[index, axis]
+
+            if predicate is None or predicate(self.restaurant_ids[index]):
+                chord = np.linalg.norm(target - self.vectors[index])
+                if len(found) < count:
+                    heapq.heappush(found, (-chord, index))
+                elif chord < -found[0][0]:
+                    heapq.heapreplace(found, (-chord, index))
+
+            near, far = (left, right) if difference < 0 else (right, left)
+            search(near)
+            if len(found) < count or abs(difference) < -found[0][0]:
+                search(far)
+
+        if count > 0:
+            search(self.root)
+
+        indices = [index for _, index in sorted(found, reverse=True)]
+        distances = calculate_distance_matrix([point], [tuple(self.points[index]) for index in indices])[0]
+        return sorted(
+            zip([self.restaurant_ids[index] for index in indices], distances.tolist()),
+            key=lambda restaurant: restaurant[1]
+        )
+
+    def has_resolved_addresses(self):
+        if not self.unresolved_addresses:
+            return False
+        coordinates = get_coordinates(self.unresolved_addresses.values(), deadline=0)
+        return any(point is not None for point in coordinates.values())
+
+
+def build_restaurants_index():
+    restaurants = list(Restaurant.objects.values_list('id', 'address'))
+    # Never wait for the geocoder: the index is built on customer requests too. Restaurants
+    # stay unresolved until their addresses are geocoded in the background
+    coordinates = get_coordinates([address for restaurant_id, address in restaurants], deadline=0)
+    return RestaurantsSpatialIndex(
+        [(restaurant_id, coordinates[address]) for restaurant_id, address in restaurants
+         if coordinates[address] is not None],
+        # Restaurants without an address are listed as unresolved too
+        [(restaurant_id, address) for restaurant_id, address in restaurants
+         if coordinates[address] is None],
+    )
+
+
+def get_restaurants_index():
+    global restaurants_index_snapshot
+    version, _ = get_cache_version(RESTAURANTS_INDEX_VERSION_KEY)
+    snapshot_version, restaurants_index = restaurants_index_snapshot
+    if snapshot_version != version or restaurants_index.has_resolved_addresses():
+        restaurants_index = build_restaurants_index()
+        restaurants_index_snapshot = (version, restaurants_index)
+    return restaurants_index
+
+
+def has_stored_distances(order, restaurants_index):
+    """Check that the prefetched restaurant_distances cover every restaurant with coordinates."""
+    stored_restaurant_ids = {order_distance.restaurant_id for order_distance in order.restaurant_distances.all()}
+    return restaurants_index.resolved_restaurant_ids <= stored_restaurant_ids
+
+
+def update_order_distances(orders, restaurant_ids=None, coordinates=None, deadline=None, chunk_size=500):
+    """Recalculate and store distances between orders and the restaurants of the spatial index.
+
+    Pass `restaurant_ids` to refresh only those restaurants. Pairs with
+    unknown coordinates are not stored.
+    """
+    orders = list(orders)
+    restaurants_index = get_restaurants_index()
+    indices = [
+        index for index, restaurant_id in enumerate(restaurants_index.restaurant_ids)
+        if restaurant_ids is None or restaurant_id in restaurant_ids
+    ]
+    restaurants_points = [tuple(restaurants_index.points[index]) for index in indices]
+
+    for start in range(0, len(orders), chunk_size):
+        chunk = orders[start:start + chunk_size]
+        if coordinates is None:
+            chunk_coordinates = get_coordinates([order.address for order in chunk], deadline=deadline)
+        else:
+            chunk_coordinates = coordinates
+        matrix = calculate_distance_matrix([chunk_coordinates[order.address] for order in chunk], restaurants_points)
+
+        stale_distances = OrderRestaurantDistance.objects.filter(order__in=chunk)
+        if restaurant_ids is not None:
+            stale_distances = stale_distances.filter(restaurant__in=restaurant_ids)
+        # Two processes may refresh the same order at once, the later rows are skipped
+        with transaction.atomic():
+            stale_distances.delete()
+            OrderRestaurantDistance.objects.bulk_create([
+                OrderRestaurantDistance(
+                    order=chunk[i],
+                    restaurant_id=restaurants_index.restaurant_ids[indices[j]],
+                    distance=float(matrix[i, j]),
+                ) for i, j in zip(*np.nonzero(~np.isnan(matrix)))
+            ], ignore_conflicts=True)
+
+
+def refresh_restaurant_distances(restaurant_ids):
+    """Recalculate the distances from unprocessed orders to the restaurants.
+
+    Processed orders lose their stored distances to them and are ranked
+    on the fly if anyone opens them.
+    """
+    OrderRestaurantDistance.objects.filter(restaurant__in=restaurant_ids).exclude(order__status=0).delete()
+    unprocessed_orders = Order.objects.filter(status=0).only('id', 'address')
+    update_order_distances(unprocessed_orders, restaurant_ids=restaurant_ids, deadline=0)
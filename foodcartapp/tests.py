@@ -0,0 +1,510 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+
+from star_burger.testing import PerformanceTestCase
+
+from . import async_views
+from .geocoder import coordinates_cache, find_addresses_to_geocode, get_coordinates, pending_lookups, save_place
+from .intake import process_intake_batch
+from .models import Order, OrderEvent, OrderIntake, OrderItem, OrderRestaurantDistance, Place, Product, Restaurant
+from .models import RestaurantMenuItem, normalize_address
+from .responses import EncodedJson
+
+
+class IndexUsageTest(TestCase):
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, so the planner would prefer a sequential scan anyway
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_orders_dashboard_uses_status_index(self):
+        orders = Order.objects.filter(status=0, id__gt=0).order_by('id')[:50]
+        self.assertUsesIndex(orders, 'order_status_id_idx')
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_orders_by_registration_time_use_status_index(self):
+        orders = Order.objects.filter(status=0).order_by('registered_at')[:50]
+        self.assertUsesIndex(orders, 'order_status_registered_idx')
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_available_menu_items_use_availability_index(self):
+        menu_items = RestaurantMenuItem.objects.filter(availability=True).values_list('restaurant', 'product')
+        self.assertUsesIndex(menu_items, 'menu_item_availability_idx')
+
+
+class EndpointPerformanceTest(PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_benchmark_data', orders=1000, stdout=StringIO())
+        cls.order = {
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79261234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [
+                {'product': product_id, 'quantity': 2}
+                for product_id in Product.objects.values_list('id', flat=True)[:4]
+            ],
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def get_products(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def register_order(self):
+        response = self.client.post('/api/order/', json.dumps(self.order), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_product_list_query_count(self):
+        self.assertMaxQueries(2, self.get_products)
+        self.assertMaxQueries(0, self.get_products)
+
+    def test_register_order_query_count(self):
+        # Two of them are the savepoint queries of the test transaction
+        self.assertMaxQueries(6, self.register_order)
+
+    def test_product_list_wall_time(self):
+        def get_products():
+            cache.clear()
+            self.get_products()
+        self.assertWithinBaseline('foodcartapp.product_list_api', get_products)
+
+    def test_register_order_wall_time(self):
+        self.assertWithinBaseline('foodcartapp.register_order', self.register_order)
+
+
+class CacheVersionTest(TestCase):
+    def test_api_works_without_cache(self):
+        dummy_cache = DummyCache('dummy', {})
+        with mock.patch('foodcartapp.cache.cache', dummy_cache), mock.patch('foodcartapp.views.cache', dummy_cache):
+            self.assertEqual(self.client.get('/api/products/').status_code, 200)
+            self.assertEqual(self.client.get('/api/banners/').status_code, 200)
+
+    def test_catalogue_etag_is_weak(self):
+        cache.clear()
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class EncodedJsonTest(TestCase):
+    def setUp(self):
+        self.encoded_json = EncodedJson([{'name': 'Бургер'}] * 50)
+
+    def get_encoding(self, accept_encoding):
+        content, encoding = self.encoded_json.get_content(accept_encoding)
+        return encoding
+
+    def test_codings_with_zero_quality_are_skipped(self):
+        self.assertIsNone(self.get_encoding('gzip;q=0, br;q=0'))
+        self.assertIsNone(self.get_encoding('*;q=0'))
+        self.assertIsNone(self.get_encoding(''))
+
+    def test_accepted_codings(self):
+        self.assertEqual(self.get_encoding('gzip;q=0.5'), 'gzip')
+        self.assertEqual(self.get_encoding('deflate, GZIP'), 'gzip')
+        self.assertIn(self.get_encoding('*'), ['gzip', 'br'])
+        self.assertEqual(self.get_encoding('br;q=0, gzip'), 'gzip')
+
+
+class RegisterOrderValidationTest(TestCase):
+    def test_unknown_product_error_is_reported_per_item(self):
+        product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        response = self.client.post('/api/order/', json.dumps({
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79261234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [{'product': product.id, 'quantity': 1}, {'product': 9999, 'quantity': 1}],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['products'], [
+            {}, {'product': ['Недопустимый первичный ключ "9999" - объект не существует.']}
+        ])
+
+    def test_invalid_product_ids_get_primary_key_errors(self):
+        response = self.client.post('/api/order/', json.dumps({
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79261234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [{'product': 'abc', 'quantity': 1}, {'product': 0, 'quantity': 1}],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['products'], [
+            {'product': ['Некорректный тип. Ожидалось значение первичного ключа, получен str.']},
+            {'product': ['Недопустимый первичный ключ "0" - объект не существует.']},
+        ])
+
+
+class AsyncApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_benchmark_data', restaurants=3, products=10, orders=0, stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def post_order(self, view, products):
+        request = self.factory.post('/api/order/', json.dumps({
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79261234567',
+            'address': 'Москва, Тверская, 1',
+            'products': products,
+        }), content_type='application/json')
+        return async_to_sync(view)(request)
+
+    def test_product_list_matches_sync_view(self):
+        response = async_to_sync(async_views.product_list_api)(self.factory.get('/api/products/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.client.get('/api/products/').json())
+
+        request = self.factory.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(async_to_sync(async_views.product_list_api)(request).status_code, 304)
+
+    def test_banners_list(self):
+        response = async_to_sync(async_views.banners_list_api)(self.factory.get('/api/banners/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.client.get('/api/banners/').json())
+
+    def test_register_order(self):
+        product = Product.objects.first()
+        response = self.post_order(async_views.register_order, [{'product': product.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(id=json.loads(response.content)['id'])
+        self.assertEqual(order.total_price, product.price * 2)
+
+    def test_register_order_reports_unknown_products(self):
+        response = self.post_order(async_views.register_order, [{'product': 9999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['products'], [
+            {'product': ['Недопустимый первичный ключ "9999" - объект не существует.']}
+        ])
+
+
+@override_settings(ORDER_INTAKE_MODE='queue')
+class OrderIntakeTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+
+    def post_order(self):
+        return self.client.post('/api/order/', json.dumps({
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79261234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [{'product': self.burger.id, 'quantity': 2}, {'product': self.fries.id, 'quantity': 1}],
+        }), content_type='application/json')
+
+    def assertProcessesQueuedOrder(self):
+        response = self.post_order()
+        self.assertEqual(response.status_code, 202)
+        intake = OrderIntake.objects.get(id=response.json()['provisional_id'])
+        self.assertFalse(Order.objects.exists())
+
+        self.fries.delete()
+        self.assertEqual(process_intake_batch(10), 1)
+
+        intake.refresh_from_db()
+        order = intake.order
+        self.assertIsNotNone(intake.processed_at)
+        self.assertEqual(order.registered_at, intake.received_at)
+        self.assertEqual(order.total_price, 250)
+        self.assertCountEqual(
+            order.order_items.values_list('product', 'quantity', 'price'),
+            [(self.burger.id, 2, 200), (None, 1, 50)],
+        )
+        self.assertEqual(OrderEvent.objects.filter(order_id=order.id).count(), 1)
+
+        self.assertEqual(process_intake_batch(10), 0)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    @skipUnlessDBFeature('can_return_rows_from_bulk_insert')
+    def test_orders_are_bulk_created(self):
+        self.assertProcessesQueuedOrder()
+
+    def test_orders_are_saved_one_by_one(self):
+        with mock.patch.object(connection.features, 'can_return_rows_from_bulk_insert', False):
+            self.assertProcessesQueuedOrder()
+
+
+class OrderTotalPriceTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                          address='Москва, Тверская, 1')
+
+    def assertTotalPrice(self, total_price):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, total_price)
+
+    def test_total_price_follows_order_items(self):
+        order_item = OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=200)
+        self.assertTotalPrice(200)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=1, price=100)
+        self.assertTotalPrice(300)
+
+        order_item.quantity = 3
+        order_item.price = 300
+        order_item.save()
+        self.assertTotalPrice(400)
+
+        order_item.delete()
+        self.assertTotalPrice(100)
+        self.order.order_items.all().delete()
+        self.assertTotalPrice(0)
+
+
+class TotalPriceMigrationTest(TransactionTestCase):
+    migrate_from = [('foodcartapp', '0055_auto_20261018_0520')]
+    migrate_to = [('foodcartapp', '0057_order_total_price')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.migrate_from)
+
+    def tearDown(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.executor.loader.graph.leaf_nodes())
+
+    def test_total_price_is_filled_from_order_items(self):
+        apps = self.executor.loader.project_state(self.migrate_from).apps
+        Product = apps.get_model('foodcartapp', 'Product')
+        Order = apps.get_model('foodcartapp', 'Order')
+        OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+        product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                     address='Москва, Тверская, 1')
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=200)
+        OrderItem.objects.create(order=order, product=None, quantity=1, price=50)
+        empty_order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                           address='Москва, Тверская, 1')
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.migrate_to)
+
+        Order = self.executor.loader.project_state(self.migrate_to).apps.get_model('foodcartapp', 'Order')
+        self.assertEqual(Order.objects.get(id=order.id).total_price, 250)
+        self.assertEqual(Order.objects.get(id=empty_order.id).total_price, 0)
+
+
+class FindAddressesToGeocodeTest(TestCase):
+    def create_order(self, address):
+        return Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567', address=address)
+
+    def test_skips_spelling_variants_of_known_addresses(self):
+        for number in range(1, 6):
+            Place.objects.create(address=f'Москва, Арбат, {number}', lon=37.6, lat=55.75)
+            self.create_order(f'МОСКВА,  АРБАТ, {number}')
+        self.create_order('Москва, Тверская, 1')
+        self.create_order('москва, тверская, 1')
+
+        self.assertEqual(find_addresses_to_geocode(2), ['Москва, Тверская, 1'])
+
+
+class GeocoderStub(BaseHTTPRequestHandler):
+    """Answers like the Yandex geocoder.
+
+    Slowly for the addresses in `delays`, with an error for those in `failing`
+    and with nothing found for those in `unknown`.
+    """
+
+    delays = {}
+    failing = set()
+    unknown = set()
+    requests = []
+
+    def do_GET(self):
+        address = parse_qs(urlsplit(self.path).query)['geocode'][0]
+        self.requests.append(address)
+        time.sleep(self.delays.get(address, 0))
+        if address in self.failing:
+            self.send_error(500)
+            return
+        found_places = [] if address in self.unknown else [{'GeoObject': {'Point': {'pos': '37.6 55.75'}}}]
+        body = json.dumps({'response': {'GeoObjectCollection': {'featureMember': found_places}}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeocoderStubServerTest(TransactionTestCase):
+    # The geocoder threads use their own database connections, so the data must be committed
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), GeocoderStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.settings_override = override_settings(GEOCODER_URL=f'http://{host}:{port}/1.x', GEOCODER_TIMEOUT=5)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        coordinates_cache.clear()
+        GeocoderStub.requests = []
+        GeocoderStub.delays = {'Москва, Медленная, 1': 0.5}
+        GeocoderStub.failing = set()
+        GeocoderStub.unknown = set()
+
+    def get_retry_delay(self, address):
+        place = Place.objects.get(normalized_address=normalize_address(address))
+        return (place.retry_at - place.fetched_at).total_seconds()
+
+    def assertNotRequestedBeforeRetry(self, address):
+        coordinates_cache.clear()
+        requests_count = len(GeocoderStub.requests)
+        self.assertEqual(get_coordinates([address], deadline=5), {address: None})
+        self.assertEqual(len(GeocoderStub.requests), requests_count)
+
+    def pass_retry_time(self, address):
+        Place.objects.filter(normalized_address=normalize_address(address)).\
+            update(retry_at=timezone.now() - timedelta(seconds=1))
+        coordinates_cache.clear()
+
+    def test_slow_address_is_none_within_deadline_and_saved_later(self):
+        address = 'Москва, Медленная, 1'
+        started_at = time.monotonic()
+        self.assertEqual(get_coordinates([address], deadline=0.1), {address: None})
+        self.assertLess(time.monotonic() - started_at, 0.4)
+
+        # The lookup goes on in the background
+        pending_lookups[normalize_address(address)].result(timeout=5)
+        place = Place.objects.get(normalized_address=normalize_address(address))
+        self.assertEqual((place.lon, place.lat), (37.6, 55.75))
+        self.assertEqual(coordinates_cache.get(normalize_address(address)), (37.6, 55.75, None))
+        self.assertEqual(get_coordinates([address]), {address: (37.6, 55.75)})
+        self.assertEqual(GeocoderStub.requests, [address])
+
+    def test_database_error_in_background_lookup_is_not_raised(self):
+        address = 'Москва, Тверская, 1'
+        with mock.patch('foodcartapp.geocoder.save_place', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('foodcartapp.geocoder', 'ERROR'):
+            self.assertEqual(get_coordinates([address], deadline=5), {address: (37.6, 55.75)})
+
+    @override_settings(GEOCODER_RETRY_DELAY=60, GEOCODER_MAX_RETRY_DELAY=200)
+    def test_failed_lookups_are_retried_with_doubling_delay(self):
+        address = 'Москва, Сломанная, 1'
+        GeocoderStub.failing = {address}
+        for retry_delay in [60, 120, 200, 200]:
+            self.assertEqual(get_coordinates([address], deadline=5), {address: None})
+            self.assertEqual(self.get_retry_delay(address), retry_delay)
+            self.assertNotRequestedBeforeRetry(address)
+            self.pass_retry_time(address)
+
+        GeocoderStub.failing = set()
+        self.assertEqual(get_coordinates([address], deadline=5), {address: (37.6, 55.75)})
+        self.assertEqual(GeocoderStub.requests, [address] * 5)
+        place = Place.objects.get(normalized_address=normalize_address(address))
+        self.assertEqual((place.failed_attempts, place.retry_at), (0, None))
+
+    @override_settings(GEOCODER_RETRY_DELAY=60, GEOCODER_NOT_FOUND_TTL=3600)
+    def test_unknown_address_is_retried_after_ttl(self):
+        address = 'Москва, Несуществующая, 1'
+        GeocoderStub.unknown = {address}
+        self.assertEqual(get_coordinates([address], deadline=5), {address: None})
+        self.assertEqual(self.get_retry_delay(address), 3600)
+        self.assertNotRequestedBeforeRetry(address)
+
+        self.pass_retry_time(address)
+        self.assertEqual(get_coordinates([address], deadline=5), {address: None})
+        self.assertEqual(GeocoderStub.requests, [address, address])
+
+    def test_concurrent_lookups_share_one_request(self):
+        address = 'Москва, Медленная, 1'
+
+        def lookup(_):
+            try:
+                return get_coordinates([address], deadline=5)[address]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            points = list(executor.map(lookup, range(5)))
+        self.assertEqual(points, [(37.6, 55.75)] * 5)
+        self.assertEqual(GeocoderStub.requests, [address])
+
+
+class PlaceDistancesTest(TransactionTestCase):
+    # The distances are stored on commit
+
+    def setUp(self):
+        cache.clear()
+        coordinates_cache.clear()
+        save_place('Москва, Тверская, 1', (37.6, 55.75))
+        # Known-bad until geocoded, so creating the objects below starts no lookups
+        save_place('Москва, Арбат, 1', None)
+        save_place('Москва, Арбат, 2', None)
+        self.restaurant = Restaurant.objects.create(name='Тверская', address='Москва, Тверская, 1')
+        self.order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                          address='Москва, Арбат, 1')
+
+    def test_geocoded_order_address_stores_distances(self):
+        self.assertFalse(OrderRestaurantDistance.objects.exists())
+        save_place('Москва, Арбат, 1', (37.59, 55.75))
+        self.assertEqual(
+            list(OrderRestaurantDistance.objects.values_list('order', 'restaurant')),
+            [(self.order.id, self.restaurant.id)],
+        )
+
+    def test_geocoded_restaurant_address_stores_distances(self):
+        save_place('Москва, Арбат, 1', (37.59, 55.75))
+        restaurant = Restaurant.objects.create(name='Арбат', address='Москва, Арбат, 2')
+        save_place('Москва, Арбат, 2', (37.59, 55.75))
+        self.assertEqual(OrderRestaurantDistance.objects.get(restaurant=restaurant).distance, 0)
+
+    def test_moved_restaurant_refreshes_unprocessed_orders_only(self):
+        save_place('Москва, Арбат, 1', (37.59, 55.75))
+        processed_order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                               address='Москва, Арбат, 1', status=1)
+        self.assertEqual(OrderRestaurantDistance.objects.count(), 2)
+
+        self.restaurant.address = 'Москва, Арбат, 2'
+        self.restaurant.save()
+        save_place('Москва, Арбат, 2', (37.59, 55.75))
+        self.assertEqual(OrderRestaurantDistance.objects.get(order=self.order).distance, 0)
+        self.assertFalse(OrderRestaurantDistance.objects.filter(order=processed_order).exists())
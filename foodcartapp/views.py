@@ -1,43 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django.db.models import Prefetch
+from django.views.decorators.http import condition
 
+from .cache import BANNERS_VERSION_KEY, CATALOGUE_VERSION_KEY, get_cache_version
+from .intake import enqueue_order
+from .models import Banner
 from .models import Order
 from .models import OrderItem
 from .models import Product
+from .models import RestaurantMenuItem
+from .responses import EncodedJson, encoded_json_response
 
+from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import Field, IntegerField, ModelSerializer, PrimaryKeyRelatedField, Serializer
 
 
-def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
+banners_snapshot = (None, None)
+
+
+def serialize_banners():
+    return EncodedJson([
         {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+            'title': banner.title,
+            'src': banner.image.url,
+            'text': banner.text,
+        } for banner in Banner.objects.active()
+    ])
 
 
-def product_list_api(request):
-    products = Product.objects.select_related('category').available()
+def get_banners():
+    global banners_snapshot
+    version, _ = get_cache_version(BANNERS_VERSION_KEY)
+    snapshot_version, banners = banners_snapshot
+    if snapshot_version != version:
+        banners = serialize_banners()
+        banners_snapshot = (version, banners)
+    return banners
+
+
+def banners_list_api(request):
+    return encoded_json_response(request, get_banners())
+
+
+def get_catalogue_etag(request):
+    etag, modified_at = get_cache_version(CATALOGUE_VERSION_KEY)
+    # Weak, because the same catalogue is sent as identity, gzip and br bodies
+    return f'W/"{etag}"'
+
+
+def get_catalogue_last_modified(request):
+    etag, modified_at = get_cache_version(CATALOGUE_VERSION_KEY)
+    return modified_at
+
+
+def serialize_catalogue():
+    available_menu_items = RestaurantMenuItem.objects.filter(availability=True).\
+        select_related('restaurant').order_by('restaurant__name')
+    products = Product.objects.select_related('category').available().prefetch_related(
+        Prefetch('menu_items', queryset=available_menu_items, to_attr='available_menu_items')
+    )
 
     dumped_products = []
     for product in products:
@@ -52,22 +78,56 @@ def product_list_api(request):
                 'name': product.category.name,
             },
             'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
+            'restaurants': [
+                {
+                    'id': menu_item.restaurant.id,
+                    'name': menu_item.restaurant.name,
+                } for menu_item in product.available_menu_items
+            ]
         }
         dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return EncodedJson(dumped_products)
 
 
-class OrderItemSerializer(ModelSerializer):
-    class Meta:
-        model = OrderItem
-        fields = ['product', 'quantity']
+def get_catalogue():
+    etag, modified_at = get_cache_version(CATALOGUE_VERSION_KEY)
+    cache_key = f'catalogue:{etag}'
+    catalogue = cache.get(cache_key)
+    if catalogue is None:
+        catalogue = serialize_catalogue()
+        cache.set(cache_key, catalogue, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return catalogue
+
+
+@condition(etag_func=get_catalogue_etag, last_modified_func=get_catalogue_last_modified)
+def product_list_api(request):
+    return encoded_json_response(request, get_catalogue())
+
+
+class ProductIdField(Field):
+    """A product id with the errors of PrimaryKeyRelatedField. validate_products checks that the products exist."""
+
+    default_error_messages = {
+        'incorrect_type': PrimaryKeyRelatedField.default_error_messages['incorrect_type'],
+        'does_not_exist': PrimaryKeyRelatedField.default_error_messages['does_not_exist'],
+    }
+
+    def to_internal_value(self, data):
+        try:
+            product_id = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if product_id < 1:
+            self.fail('does_not_exist', pk_value=data)
+        return product_id
+
+    def to_representation(self, value):
+        return value
+
+
+class OrderItemSerializer(Serializer):
+    product = ProductIdField()
+    quantity = IntegerField(min_value=1)
 
 
 class OrderSerializer(ModelSerializer):
@@ -80,31 +140,55 @@ class OrderSerializer(ModelSerializer):
     def validate_products(self, products):
         if not products:
             raise ValidationError('Empty list.')
-        return products
 
+        found_products = Product.objects.in_bulk({fields['product'] for fields in products})
+        if any(fields['product'] not in found_products for fields in products):
+            # The same per-item errors PrimaryKeyRelatedField gives
+            does_not_exist = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+            raise ValidationError([
+                {} if fields['product'] in found_products
+                else {'product': [does_not_exist.format(pk_value=fields['product'])]}
+                for fields in products
+            ])
+
+        return [
+            {'product': found_products[fields['product']], 'quantity': fields['quantity']}
+            for fields in products
+        ]
 
-@api_view(['POST'])
-def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+
+def place_order(serializer):
+    """Save the validated order, or queue it in the queue intake mode. Returns the response data and status."""
+    if settings.ORDER_INTAKE_MODE == 'queue':
+        intake = enqueue_order(serializer.validated_data)
+        return {**serializer.data, 'provisional_id': intake.id}, status.HTTP_202_ACCEPTED
+
+    order_items = [
+        OrderItem(
+            product=fields['product'],
+            quantity=fields['quantity'],
+            price=fields['product'].price * fields['quantity'],
+        ) for fields in serializer.validated_data['order_items']
+    ]
 
     with transaction.atomic():
         order = Order.objects.create(
             firstname=serializer.validated_data['firstname'],
             lastname=serializer.validated_data['lastname'],
             phonenumber=serializer.validated_data['phonenumber'],
-            address=serializer.validated_data['address']
+            address=serializer.validated_data['address'],
+            total_price=sum(order_item.price for order_item in order_items)
         )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
 
-        products_fields = serializer.validated_data['order_items']
+    return OrderSerializer(order).data, status.HTTP_200_OK
 
-        order_items = [
-            OrderItem(
-                order=order,
-                price=fields['product'].price * fields['quantity'],
-                **fields
-            ) for fields in products_fields
-        ]
-        OrderItem.objects.bulk_create(order_items)
 
-    return Response(OrderSerializer(order).data)
+@api_view(['POST'])
+def register_order(request):
+    serializer = OrderSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data, response_status = place_order(serializer)
+    return Response(data, status=response_status)
@@ -1,3 +1,153 @@
-from django.test import TestCase
+import math
+import time
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from foodcartapp.geocoder import get_coordinates
+from foodcartapp.models import Order, OrderEvent, OrderItem, OrderRestaurantDistance, Place, Product, Restaurant
+from foodcartapp.models import RestaurantMenuItem
+from foodcartapp.spatial import get_restaurants_index
+
+from star_burger.testing import PerformanceTestCase
+
+from .views import get_menu_index, serialize_order, serialize_orders
+
+
+class SerializeOrderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        for name, address in [('WithAddr', 'Тестовая улица, 1'), ('NoAddr', '')]:
+            restaurant = Restaurant.objects.create(name=name, address=address)
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+        Place.objects.create(address='Тестовая улица, 1', lon=37.6, lat=55.75)
+        Place.objects.create(address='Тестовая улица, 2', lon=37.61, lat=55.76)
+        order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                     address='Тестовая улица, 2')
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=100)
+
+    def get_restaurant_names(self, order_coordinates):
+        order = Order.objects.prefetch_related('order_items').get()
+        serialized_order = serialize_order(order, get_menu_index(), get_restaurants_index(), order_coordinates)
+        return sorted(restaurant['name'] for restaurant in serialized_order['restaurants'])
+
+    def test_restaurants_without_address_do_not_depend_on_order_coordinates(self):
+        order_coordinates = get_coordinates(['Тестовая улица, 2'])['Тестовая улица, 2']
+        self.assertEqual(self.get_restaurant_names(order_coordinates), ['NoAddr', 'WithAddr'])
+        self.assertEqual(self.get_restaurant_names(None), ['NoAddr', 'WithAddr'])
+
+    def test_serializing_orders_stores_no_distances(self):
+        orders = list(Order.objects.prefetch_related('order_items', 'restaurant_distances'))
+        serialized_order, = serialize_orders(orders, get_menu_index())
+        self.assertEqual([restaurant['name'] for restaurant in serialized_order['restaurants']], ['WithAddr', 'NoAddr'])
+        self.assertFalse(OrderRestaurantDistance.objects.exists())
+
+
+@override_settings(ORDER_EVENTS_WAIT=0.3)
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('manager', password='manager', is_staff=True))
+        self.order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79261234567',
+                                          address='Тестовая улица, 2')
+
+    def get_events(self, **headers):
+        started_at = time.monotonic()
+        response = self.client.get('/manager/orders/events/?status=all&cursor=0', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        content = response.content.decode()
+        last_event_id = content.rsplit('id: ', 1)[1].strip()
+        return content, last_event_id, time.monotonic() - started_at
+
+    def test_returns_at_once_when_orders_changed(self):
+        content, _, duration = self.get_events()
+        self.assertIn(f'order-{self.order.id}', content)
+        self.assertLess(duration, 0.3)
+
+    def test_returns_after_wait_without_changes(self):
+        _, last_event_id, _ = self.get_events()
+        content, next_event_id, duration = self.get_events(HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertNotIn('event: order', content)
+        self.assertEqual(next_event_id, last_event_id)
+        self.assertGreaterEqual(duration, 0.3)
+        self.assertLess(duration, 1)
+
+    def test_sends_events_committed_below_the_cursor(self):
+        first_event = OrderEvent.objects.get()
+        other_order_id = self.order.id + 1
+        # A slow transaction commits its event after a later one was sent
+        late_event_id = first_event.id + 1
+        OrderEvent.objects.create(id=first_event.id + 2, order_id=self.order.id)
+        _, last_event_id, _ = self.get_events()
+        self.assertEqual(last_event_id, f'{first_event.id + 2},{first_event.id}')
+
+        OrderEvent.objects.create(id=late_event_id, order_id=other_order_id)
+        content, last_event_id, _ = self.get_events(HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertIn(f'"id": {other_order_id}', content)
+        self.assertNotIn(f'"id": {self.order.id}', content)
+        self.assertEqual(last_event_id, f'{first_event.id + 2},{first_event.id},{late_event_id}')
+
+    @override_settings(ORDER_EVENTS_WAIT=0)
+    def test_returns_at_once_without_wait(self):
+        _, last_event_id, _ = self.get_events()
+        content, _, duration = self.get_events(HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertNotIn('event: order', content)
+        self.assertLess(duration, 0.2)
+
+
+class ManagerPagesPerformanceTest(PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_benchmark_data', orders=10000, stdout=StringIO())
+        cls.manager = User.objects.create_user('manager', password='manager', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def get_orders(self, query=''):
+        response = self.client.get(f'/manager/orders/{query}')
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def test_orders_page_query_count(self):
+        self.get_orders('?status=all')
+        self.assertMaxQueries(7, self.get_orders, '?status=all')
+        self.assertMaxQueries(7, self.get_orders, '?status=0&after=5000')
+
+    @override_settings(ORDERS_STREAM_CHUNK_SIZE=500)
+    def test_orders_stream_query_count_grows_with_chunks(self):
+        orders_count = Order.objects.filter(status=0).count()
+        chunks_count = math.ceil(orders_count / 500)
+        # The order items and the stored distances are fetched once per chunk, not per order
+        content = self.assertMaxQueries(6 + 2 * chunks_count, self.get_orders, '?status=0&stream=1')
+        self.assertEqual(content.count(b'<tr id="order-'), orders_count)
+
+    def get_products(self):
+        response = self.client.get('/manager/products/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_products_page_query_count(self):
+        self.assertMaxQueries(6, self.get_products)
+        self.assertMaxQueries(4, self.get_products)
+
+    def test_orders_page_wall_time(self):
+        self.get_orders('?status=all')
+        self.assertWithinBaseline('restaurateur.view_orders', lambda: self.get_orders('?status=all'))
+
+    def test_orders_stream_wall_time(self):
+        self.assertWithinBaseline('restaurateur.view_orders.stream', lambda: self.get_orders('?status=0&stream=1'))
+
+    def test_products_page_wall_time(self):
+        def get_products():
+            cache.clear()
+            self.get_products()
+        self.assertWithinBaseline('restaurateur.view_products', get_products)
@@ -1,19 +1,33 @@
-import requests
-import os
+import json
+import time
+from datetime import timedelta
+from itertools import islice
 
 from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Prefetch, Q, prefetch_related_objects
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 
-from geopy import distance
-from requests.exceptions import RequestException
+import numpy as np
 
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem, Place
+from foodcartapp.geocoder import get_coordinates
+from foodcartapp.models import Product, Restaurant, Order, OrderEvent, OrderRestaurantDistance, RestaurantMenuItem
+from foodcartapp.spatial import get_restaurants_index, has_stored_distances
+from foodcartapp.cache import CATALOGUE_VERSION_KEY, get_cache_version
+
+
+ORDER_EVENTS_COMMIT_LAG = timedelta(seconds=5)
+ORDER_EVENTS_CHECK_INTERVAL = 0.2
 
 
 class Login(forms.Form):
@@ -68,27 +82,51 @@ def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
 
+class AvailabilityGrid:
+    """Product x restaurant availability as a boolean matrix.
+
+    The last row and column are always False, so products and restaurants
+    without menu items map to index -1.
+    """
+
+    def __init__(self, menu_items):
+        menu_items = list(menu_items)
+        self.product_rows = {}
+        self.restaurant_columns = {}
+        for product_id, restaurant_id, availability in menu_items:
+            self.product_rows.setdefault(product_id, len(self.product_rows))
+            self.restaurant_columns.setdefault(restaurant_id, len(self.restaurant_columns))
+
+        self.matrix = np.zeros((len(self.product_rows) + 1, len(self.restaurant_columns) + 1), dtype=bool)
+        for product_id, restaurant_id, availability in menu_items:
+            self.matrix[self.product_rows[product_id], self.restaurant_columns[restaurant_id]] = availability
+
+    def get_availability(self, products, restaurants):
+        rows = [self.product_rows.get(product.id, -1) for product in products]
+        columns = [self.restaurant_columns.get(restaurant.id, -1) for restaurant in restaurants]
+        return self.matrix[np.ix_(rows, columns)].tolist()
+
+
+def get_availability_grid():
+    version, _ = get_cache_version(CATALOGUE_VERSION_KEY)
+    cache_key = f'availability_grid:{version}'
+    availability_grid = cache.get(cache_key)
+    if availability_grid is None:
+        menu_items = RestaurantMenuItem.objects.values_list('product', 'restaurant', 'availability')
+        availability_grid = AvailabilityGrid(menu_items)
+        cache.set(cache_key, availability_grid, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return availability_grid
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
+    products = list(Product.objects.select_related('category'))
 
-    default_availability = {restaurant.id: False for restaurant in restaurants}
-    products_with_restaurants = []
-    for product in products:
-
-        availability = {
-            **default_availability,
-            **{item.restaurant_id: item.availability for item in product.menu_items.all()},
-        }
-        orderer_availability = [availability[restaurant.id] for restaurant in restaurants]
-
-        products_with_restaurants.append(
-            (product, orderer_availability)
-        )
+    availability = get_availability_grid().get_availability(products, restaurants)
 
     return render(request, template_name="products_list.html", context={
-        'products_with_restaurants': products_with_restaurants,
+        'products_with_restaurants': list(zip(products, availability)),
         'restaurants': restaurants,
     })
 
@@ -100,25 +138,47 @@ def view_restaurants(request):
     })
 
 
-def serialize_order(order, restaurants_with_products_ids):
-    available_restaurants = get_available_restaurants(
-        restaurants_with_products_ids, get_product_ids_for_order(order)
-    )
-
-    formalized_available_restaurants = [formalize_restaurant(restaurant, order.address)
-                                        for restaurant in available_restaurants.values()]
-    available_restaurants_sorted_by_distance = sorted(
-        formalized_available_restaurants,
-        key=lambda restaurant: (restaurant['distance_to_order'] is None,
-                                restaurant['distance_to_order'])
-    )
+def serialize_order(order, menu_index, restaurants_index, order_coordinates):
+    order_mask = menu_index.get_order_mask(get_product_ids_for_order(order))
+
+    if has_stored_distances(order, restaurants_index):
+        nearest_restaurants = list(islice(
+            (
+                (order_distance.restaurant_id, order_distance.distance)
+                for order_distance in order.restaurant_distances.all()
+                if order_distance.restaurant_id in restaurants_index.resolved_restaurant_ids
+                and menu_index.can_fulfil(order_distance.restaurant_id, order_mask)
+            ),
+            settings.NEAREST_RESTAURANTS_COUNT
+        ))
+        unresolved_restaurant_ids = restaurants_index.unresolved_addresses.keys()
+    elif order_coordinates is None:
+        nearest_restaurants = []
+        unresolved_restaurant_ids = menu_index.restaurants.keys()
+    else:
+        nearest_restaurants = restaurants_index.nearest(
+            order_coordinates,
+            settings.NEAREST_RESTAURANTS_COUNT,
+            predicate=lambda restaurant_id: menu_index.can_fulfil(restaurant_id, order_mask)
+        )
+        unresolved_restaurant_ids = restaurants_index.unresolved_addresses.keys()
+
+    available_restaurants_sorted_by_distance = [
+        formalize_restaurant(menu_index.restaurants[restaurant_id], distance_to_order)
+        for restaurant_id, distance_to_order in nearest_restaurants
+    ]
+    available_restaurants_sorted_by_distance += [
+        formalize_restaurant(menu_index.restaurants[restaurant_id], None)
+        for restaurant_id in unresolved_restaurant_ids
+        if menu_index.can_fulfil(restaurant_id, order_mask)
+    ]
 
     return {
         'id': order.id,
         'status': order.get_status_display(),
         'payment': order.get_payment_display(),
         'restaurants': available_restaurants_sorted_by_distance,
-        'price': order.order_price,
+        'price': order.total_price,
         'firstname': order.firstname,
         'lastname': order.lastname,
         'phonenumber': order.phonenumber,
@@ -127,14 +187,7 @@ def serialize_order(order, restaurants_with_products_ids):
     }
 
 
-def formalize_restaurant(restaurant, order_address):
-    try:
-        distance_to_order = get_distance_between_two_addresses(
-            restaurant['address'], order_address
-        )
-    except RequestException:
-        distance_to_order = None
-
+def formalize_restaurant(restaurant, distance_to_order):
     return {
         'name': restaurant['name'],
         'address': restaurant['address'],
@@ -142,71 +195,250 @@ def formalize_restaurant(restaurant, order_address):
     }
 
 
-def get_distance_between_two_addresses(address1, address2):
-    apikey = os.environ['YANDEX_API_KEY']
-
-    coords = []
-    for address in [address1, address2]:
-        try:
-            place = Place.objects.get(address=address)
-        except Place.DoesNotExist:
-            lon, lat = fetch_coordinates(apikey, address)
-            place = Place.objects.create(address=address, lon=lon, lat=lat)
-            place.save()
-        coords.append((place.lon, place.lat))
-    distance_between_two_addresses = distance.distance(coords[0], coords[1]).km
-    return round(distance_between_two_addresses, 3)
+class RestaurantsMenuIndex:
+    """Restaurant menus stored as bitmasks over dense product bit positions."""
+
+    def __init__(self, restaurant_menu_items):
+        self.product_bits = {}
+        self.restaurants = {}
+        self.menu_masks = {}
+        for restaurant_id, restaurant_name, restaurant_address, product_id in restaurant_menu_items:
+            if product_id not in self.product_bits:
+                self.product_bits[product_id] = 1 << len(self.product_bits)
+            if restaurant_id not in self.restaurants:
+                self.restaurants[restaurant_id] = {
+                    'name': restaurant_name,
+                    'address': restaurant_address,
+                }
+                self.menu_masks[restaurant_id] = 0
+            self.menu_masks[restaurant_id] |= self.product_bits[product_id]
+
+    def get_order_mask(self, product_ids):
+        order_mask = 0
+        for product_id in product_ids:
+            if product_id not in self.product_bits:
+                return None
+            order_mask |= self.product_bits[product_id]
+        return order_mask
+
+    def can_fulfil(self, restaurant_id, order_mask):
+        if order_mask is None or restaurant_id not in self.menu_masks:
+            return False
+        return order_mask & self.menu_masks[restaurant_id] == order_mask
 
 
-def get_available_restaurants(restaurants_with_products_ids, product_ids):
-    available_restaurants = {}
-    for restaurant_id, restaurant_properties in restaurants_with_products_ids.items():
-        if product_ids.issubset(restaurant_properties['products']):
-            available_restaurants[restaurant_id] = restaurant_properties
-    return available_restaurants
+def get_product_ids_for_order(order):
+    return {order_item.product_id for order_item in order.order_items.all()}
 
 
-def get_product_ids_for_order(order):
-    order_items = order.order_items
-    product_ids = set(order_items.values_list('product', flat=True))
-    return product_ids
+def parse_orders_filter(request):
+    statuses = dict(Order.STATUS_CHOICES)
+    status = request.GET.get('status', '0')
+    if status != 'all':
+        try:
+            status = int(status)
+        except ValueError:
+            status = 0
+        if status not in statuses:
+            status = 0
 
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    return status, after
 
-def fetch_coordinates(apikey, place):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    params = {"geocode": place, "apikey": apikey, "format": "json"}
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return lon, lat
 
+def iterate_in_chunks(queryset, chunk_size):
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
 
+def get_menu_index():
     restaurant_menu_items = RestaurantMenuItem.objects.\
         filter(availability=True).\
         values_list('restaurant', 'restaurant__name', 'restaurant__address', 'product')
+    return RestaurantsMenuIndex(restaurant_menu_items)
+
 
-    restaurants_with_products_ids = {}
-    for menu_item in restaurant_menu_items:
-        restaurant_id, restaurant_name, restaurant_address, product_id = menu_item
-        if restaurant_id in restaurants_with_products_ids:
-            restaurants_with_products_ids[restaurant_id]['products'].add(product_id)
-        else:
-            restaurants_with_products_ids[restaurant_id] = {
-                'name': restaurant_name,
-                'address': restaurant_address,
-                'products': {product_id}
-            }
+def get_last_order_event_id():
+    return OrderEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
 
-    orders = Order.objects.fetch_with_order_price().order_by('id')
 
-    serialized_orders = [serialize_order(order, restaurants_with_products_ids)
-                         for order in orders]
+def get_orders_page_url(status):
+    return f'{reverse("restaurateur:view_orders")}?status={status}'
+
+
+def get_order_prefetches():
+    return [
+        'order_items',
+        Prefetch('restaurant_distances', queryset=OrderRestaurantDistance.objects.order_by('distance')),
+    ]
+
+
+def serialize_orders(orders, menu_index):
+    """Serialize orders with prefetched items and stored restaurant distances.
+
+    Orders without stored distances are ranked with the spatial index. The
+    page never writes them: the signals store distances once the addresses
+    have coordinates.
+    """
+    restaurants_index = get_restaurants_index()
+    incomplete_orders = [order for order in orders if not has_stored_distances(order, restaurants_index)]
+    coordinates = get_coordinates([order.address for order in incomplete_orders])
+    return [
+        serialize_order(order, menu_index, restaurants_index, coordinates.get(order.address))
+        for order in orders
+    ]
+
+
+def stream_orders(request, orders, menu_index, context):
+    """Render the page around the rows, then render the rows chunk by chunk."""
+    page = render_to_string('order_items.html', context={**context, 'orders': [], 'streaming': True},
+                            request=request)
+    header, footer = page.split('<!-- order rows -->')
+    row_template = get_template('order_row.html')
+    chunk_size = settings.ORDERS_STREAM_CHUNK_SIZE
+
+    yield header
+    # iterator() ignores prefetch_related, so the order items and distances are fetched per chunk
+    for chunk in iterate_in_chunks(orders, chunk_size):
+        prefetch_related_objects(chunk, *get_order_prefetches())
+        yield ''.join(
+            row_template.render({'order': serialized_order, 'page_url': context['page_url']}, request)
+            for serialized_order in serialize_orders(chunk, menu_index)
+        )
+    yield footer
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    status, after = parse_orders_filter(request)
+    page_size = settings.ORDERS_PAGE_SIZE
+    # Taken before reading the orders, so the live updates miss nothing
+    events_cursor = get_last_order_event_id()
+    menu_index = get_menu_index()
+
+    orders = Order.objects.filter(id__gt=after).order_by('id')
+    if status != 'all':
+        orders = orders.filter(status=status)
+
+    context = {
+        'statuses': Order.STATUS_CHOICES,
+        'current_status': status,
+        'is_first_page': not after,
+        'after': after,
+        'events_cursor': events_cursor,
+        'page_url': request.get_full_path(),
+    }
+
+    if request.GET.get('stream'):
+        return StreamingHttpResponse(stream_orders(request, orders, menu_index, context))
+
+    orders = list(orders.prefetch_related(*get_order_prefetches())[:page_size + 1])
+    has_next_page = len(orders) > page_size
+    orders = orders[:page_size]
+
+    serialized_orders = serialize_orders(orders, menu_index)
 
     return render(request, template_name='order_items.html', context={
-        'orders': serialized_orders
+        **context,
+        'orders': serialized_orders,
+        'next_cursor': orders[-1].id if has_next_page else None,
     })
+
+
+def format_server_sent_event(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def parse_order_events_state(request):
+    """Return the cursor and the ids of the recent events the browser already has."""
+    try:
+        state = request.META.get('HTTP_LAST_EVENT_ID') or request.GET['cursor']
+        event_ids = [int(event_id) for event_id in state.split(',')]
+    except (KeyError, ValueError):
+        return get_last_order_event_id(), set()
+    # The cursor event comes first and has been sent as well
+    return event_ids[0], set(event_ids)
+
+
+def find_order_events(cursor, sent_event_ids):
+    """Return the events after the `cursor` event and the new cursor state.
+
+    Events are numbered in insertion order but become visible at commit,
+    so a slow transaction may commit an event below the cursor. Recent
+    events are therefore re-read, and the ids already sent travel along
+    with the cursor in the event id.
+    """
+    recent_since = timezone.now() - ORDER_EVENTS_COMMIT_LAG
+    events = list(
+        OrderEvent.objects.filter(Q(id__gt=cursor) | Q(created_at__gte=recent_since)).
+        order_by('id').
+        values_list('id', 'order_id', 'created_at')
+    )
+    new_events = [
+        (event_id, order_id) for event_id, order_id, _ in events
+        if event_id > cursor or event_id not in sent_event_ids
+    ]
+    if events:
+        cursor = max(cursor, events[-1][0])
+    sent_event_ids = {event_id for event_id, _, created_at in events if created_at >= recent_since}
+    return new_events, cursor, sent_event_ids
+
+
+def render_order_events(request, status, events, event_id):
+    order_ids = sorted({order_id for _, order_id in events})
+    orders = Order.objects.filter(id__in=order_ids).prefetch_related(*get_order_prefetches())
+    if status != 'all':
+        orders = orders.filter(status=status)
+    serialized_orders = {
+        serialized_order['id']: serialized_order
+        for serialized_order in serialize_orders(list(orders), get_menu_index())
+    }
+
+    row_template = get_template('order_row.html')
+    page_url = get_orders_page_url(status)
+    messages = []
+    for order_id in order_ids:
+        serialized_order = serialized_orders.get(order_id)
+        row = None
+        if serialized_order:
+            row = row_template.render({'order': serialized_order, 'page_url': page_url}, request)
+        messages.append(format_server_sent_event(event_id, 'order', {'id': order_id, 'row': row}))
+    return messages
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_events(request):
+    """Send the rows of the orders changed after the cursor and close the connection.
+
+    The request waits at most ORDER_EVENTS_WAIT seconds for a change, so it
+    never holds a worker for long. The browser reconnects by itself after
+    ORDER_EVENTS_POLL_INTERVAL seconds and sends the last event id back.
+    """
+    status, _ = parse_orders_filter(request)
+    cursor, sent_event_ids = parse_order_events_state(request)
+    deadline = time.monotonic() + settings.ORDER_EVENTS_WAIT
+    while True:
+        events, cursor, sent_event_ids = find_order_events(cursor, sent_event_ids)
+        if events or time.monotonic() >= deadline:
+            break
+        time.sleep(ORDER_EVENTS_CHECK_INTERVAL)
+
+    event_id = ','.join(str(event_id) for event_id in [cursor, *sorted(sent_event_ids - {cursor})])
+    messages = [f'retry: {int(settings.ORDER_EVENTS_POLL_INTERVAL * 1000)}\n\n']
+    if events:
+        messages.extend(render_order_events(request, status, events, event_id))
+    # A message without data only updates the id the browser sends back
+    messages.append(f'id: {event_id}\n\n')
+
+    response = HttpResponse(''.join(messages), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
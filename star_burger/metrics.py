@@ -0,0 +1,201 @@
+import asyncio
+import hmac
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._observations = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self._lock:
+            counts, total = self._observations.get(view, ([0] * (len(self.buckets) + 1), 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._observations[view] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            observations = {view: (list(counts), total) for view, (counts, total) in self._observations.items()}
+        for view, (counts, total) in sorted(observations.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, view):
+        with self._lock:
+            self._values[view] = self._values.get(view, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for view, value in sorted(values.items()):
+            lines.append(f'{self.name}{{view="{view}"}} {value}')
+        return lines
+
+
+request_duration = Histogram(
+    'star_burger_request_duration_seconds', 'Time spent on the request, including middleware.',
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+request_queries = Histogram(
+    'star_burger_request_db_queries', 'Database queries made by the request.',
+    [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+)
+request_db_duration = Histogram(
+    'star_burger_request_db_duration_seconds', 'Time spent in database queries.',
+    [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+response_size = Histogram(
+    'star_burger_response_size_bytes', 'Size of the response body. Streaming responses are not counted.',
+    [1000, 10000, 50000, 100000, 500000, 1000000, 5000000],
+)
+query_budget_violations = Counter(
+    'star_burger_query_budget_violations_total', 'Requests that made more queries than METRICS_QUERY_BUDGETS allows.',
+)
+
+METRICS = [request_duration, request_queries, request_db_duration, response_size, query_budget_violations]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started_at
+
+
+# Context variables follow a request into the sync_to_async threads of async views
+request_query_counter = ContextVar('request_query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = request_query_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        # First, so that connection.execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, count_query)
+
+
+connection_created.connect(install_query_counter)
+
+
+class RequestMetricsMiddleware:
+    """Record queries, time and response size of the views listed in METRICS_QUERY_BUDGETS.
+
+    Queries made while a streaming response is being sent are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django call this middleware without a thread, as it does with MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        # Connections opened before this middleware was loaded
+        for connection in connections.all():
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = request_query_counter.set(counter)
+        started_at = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_query_counter.reset(token)
+        self.record(request, response, counter, time.perf_counter() - started_at)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = request_query_counter.set(counter)
+        started_at = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_query_counter.reset(token)
+        self.record(request, response, counter, time.perf_counter() - started_at)
+        return response
+
+    def record(self, request, response, counter, duration):
+        if request.resolver_match is None:
+            return
+        view = request.resolver_match.func.__name__
+        if view not in settings.METRICS_QUERY_BUDGETS:
+            return
+
+        request_duration.observe(view, duration)
+        request_queries.observe(view, counter.count)
+        request_db_duration.observe(view, counter.duration)
+        if not response.streaming:
+            response_size.observe(view, len(response.content))
+
+        budget = settings.METRICS_QUERY_BUDGETS[view]
+        if counter.count > budget:
+            query_budget_violations.inc(view)
+            logger.warning('%s made %d queries with a budget of %d: %s',
+                           view, counter.count, budget, request.get_full_path())
+
+
+def is_metrics_reader(request):
+    if request.user.is_staff:
+        return True
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(settings.METRICS_TOKEN) and hmac.compare_digest(authorization, f'Bearer {settings.METRICS_TOKEN}')
+
+
+def metrics_view(request):
+    # Behind a reverse proxy every request comes from the proxy address, so the token or a staff session is required
+    if not is_metrics_reader(request):
+        return HttpResponseForbidden()
+    lines = [line for metric in METRICS for line in metric.render()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
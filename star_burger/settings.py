@@ -26,12 +26,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'phonenumber_field',
     'rest_framework'
 ]
 
 MIDDLEWARE = [
+    'star_burger.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,9 +39,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    # The toolbar middleware is sync-only and would run async views in a thread
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'star_burger.urls'
 
 DEBUG_TOOLBAR_PANELS = [
@@ -124,3 +128,44 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "assets"),
     os.path.join(BASE_DIR, "bundles"),
 ]
+
+YANDEX_API_KEY = env('YANDEX_API_KEY', '')
+
+GEOCODER_CACHE_SIZE = env.int('GEOCODER_CACHE_SIZE', 10000)
+GEOCODER_URL = env('GEOCODER_URL', 'https://geocode-maps.yandex.ru/1.x')
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_DEADLINE = env.float('GEOCODER_DEADLINE', 3)
+GEOCODER_WORKERS = env.int('GEOCODER_WORKERS', 8)
+GEOCODER_RETRY_DELAY = env.int('GEOCODER_RETRY_DELAY', 60)
+GEOCODER_MAX_RETRY_DELAY = env.int('GEOCODER_MAX_RETRY_DELAY', 24 * 60 * 60)
+GEOCODER_NOT_FOUND_TTL = env.int('GEOCODER_NOT_FOUND_TTL', 7 * 24 * 60 * 60)
+
+DISTANCE_ENGINE = env('DISTANCE_ENGINE', 'haversine')
+
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+ORDERS_STREAM_CHUNK_SIZE = env.int('ORDERS_STREAM_CHUNK_SIZE', 500)
+NEAREST_RESTAURANTS_COUNT = env.int('NEAREST_RESTAURANTS_COUNT', 5)
+ORDER_EVENTS_POLL_INTERVAL = env.float('ORDER_EVENTS_POLL_INTERVAL', 1)
+ORDER_EVENTS_WAIT = env.float('ORDER_EVENTS_WAIT', 0)
+ORDER_EVENTS_TTL = env.int('ORDER_EVENTS_TTL', 24 * 60 * 60)
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', ''),
+    }
+}
+CATALOGUE_CACHE_TIMEOUT = env.int('CATALOGUE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+ORDER_INTAKE_MODE = env('ORDER_INTAKE_MODE', 'sync')
+ORDER_INTAKE_BATCH_SIZE = env.int('ORDER_INTAKE_BATCH_SIZE', 500)
+
+ASYNC_API = env.bool('ASYNC_API', False)
+
+METRICS_QUERY_BUDGETS = env.dict('METRICS_QUERY_BUDGETS', {
+    'product_list_api': 5,
+    'register_order': 8,
+    'view_orders': 12,
+    'view_products': 8,
+}, subcast_values=int)
+METRICS_TOKEN = env('METRICS_TOKEN', '')
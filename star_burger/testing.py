@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+
+BASELINES_FILE = os.environ.get('PERF_BASELINES_FILE', os.path.join(settings.BASE_DIR, 'perf_baselines.json'))
+# A run may take up to (1 + tolerance) times the baseline, plus a fixed slack for the fastest pages
+TOLERANCE = float(os.environ.get('PERF_TOLERANCE', 1))
+SLACK = 0.02
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE) as file:
+        return json.load(file)
+
+
+def save_baseline(name, seconds):
+    baselines = load_baselines()
+    baselines[name] = round(seconds, 4)
+    with open(BASELINES_FILE, 'w') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+class PerformanceTestCase(TestCase):
+    """Query count bounds and wall-time baselines.
+
+    A test without a baseline in perf_baselines.json fails. Run the tests with
+    PERF_UPDATE_BASELINES=1 to record the baselines.
+    """
+
+    def assertMaxQueries(self, limit, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(context), limit,
+            f'{len(context)} queries, expected at most {limit}:\n' +
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return result
+
+    def assertWithinBaseline(self, name, func, repeat=3):
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+        seconds = min(timings)
+
+        if os.environ.get('PERF_UPDATE_BASELINES'):
+            save_baseline(name, seconds)
+            return
+        baseline = load_baselines().get(name)
+        if baseline is None:
+            self.fail(f'{name} has no baseline in {BASELINES_FILE}, record it with PERF_UPDATE_BASELINES=1')
+        limit = baseline * (1 + TOLERANCE) + SLACK
+        self.assertLessEqual(seconds, limit, f'{name} took {seconds:.3f} s, the baseline is {baseline:.3f} s')
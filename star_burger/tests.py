@@ -0,0 +1,86 @@
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from .metrics import RequestMetricsMiddleware
+from .testing import PerformanceTestCase
+
+
+def count_users(request):
+    request.resolver_match = mock.Mock(func=count_users)
+    return HttpResponse(str(User.objects.count() + User.objects.filter(is_staff=True).count()))
+
+
+async def count_users_async(request):
+    return await sync_to_async(count_users)(request)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsViewTest(TestCase):
+    def test_anonymous_requests_are_forbidden(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_token_gives_access(self):
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'star_burger_request_duration_seconds', response.content)
+
+    def test_staff_gives_access(self):
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_gives_no_access(self):
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+@override_settings(METRICS_QUERY_BUDGETS={'count_users': 1})
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+    def assertRecordsQueries(self, middleware, call):
+        with mock.patch('star_burger.metrics.request_queries.observe') as observe, \
+                self.assertLogs('star_burger.metrics', 'WARNING'):
+            call(middleware)(self.request)
+        observe.assert_called_once_with('count_users', 2)
+
+    def test_sync_view(self):
+        middleware = RequestMetricsMiddleware(count_users)
+        self.assertFalse(asyncio.iscoroutinefunction(middleware))
+        self.assertRecordsQueries(middleware, lambda middleware: middleware)
+
+    def test_async_view_is_not_adapted_to_sync(self):
+        middleware = RequestMetricsMiddleware(count_users_async)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertRecordsQueries(middleware, async_to_sync)
+
+    def test_asgi_middleware_chain_is_async(self):
+        self.assertTrue(asyncio.iscoroutinefunction(ASGIHandler()._middleware_chain))
+
+
+class PerformanceTestCaseTest(PerformanceTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baselines_file = os.path.join(directory.name, 'perf_baselines.json')
+        patcher = mock.patch('star_burger.testing.BASELINES_FILE', self.baselines_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing_baseline_fails_until_recorded(self):
+        with mock.patch.dict(os.environ, {'PERF_UPDATE_BASELINES': ''}):
+            with self.assertRaisesMessage(AssertionError, 'has no baseline'):
+                self.assertWithinBaseline('noop', lambda: None)
+            self.assertFalse(os.path.exists(self.baselines_file))
+            with mock.patch.dict(os.environ, {'PERF_UPDATE_BASELINES': '1'}):
+                self.assertWithinBaseline('noop', lambda: None)
+            self.assertWithinBaseline('noop', lambda: None)
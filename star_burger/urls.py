@@ -19,14 +19,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import render
 
+from . import metrics
 from . import settings
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', render, kwargs={'template_name': 'index.html'}, name='start_page'),
-    path('api/', include('foodcartapp.urls')),
+    path('api/', include('foodcartapp.async_urls' if settings.ASYNC_API else 'foodcartapp.urls')),
     path('manager/', include('restaurateur.urls')),
-    path('api-auth/', include('rest_framework.urls'))
+    path('api-auth/', include('rest_framework.urls')),
+    path('metrics/', metrics.metrics_view),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG: